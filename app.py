@@ -1,13 +1,31 @@
 import streamlit as st
 import base64
-import io
+import os
 import uuid
-import time
-import requests
-import json
+import hashlib
 import re
-import random
+import json
+import threading
+from collections import OrderedDict, deque
 from PIL import Image
+from llm_client import OpenRouterClient, OPENROUTER_URL
+from wardrobe_store import WardrobeStore, DISPLAY_SIZE, LLM_SIZE
+from wardrobe_index import WardrobeIndex
+import features
+import retrieval
+import contact_sheet
+import composite
+import weather
+import ingest
+import recommender
+import tagging
+import archive
+import telemetry
+import prompt_builder
+from image_cache import SharedImageCache
+from chat_jobs import ChatRunner
+from response_cache import ResponseCache, make_key
+from concurrent.futures import ThreadPoolExecutor
 
 # --- 1. 頁面設定 ---
 st.set_page_config(page_title="My Stylist", page_icon="👗", layout="wide")
@@ -72,11 +90,52 @@ try:
 except:
     OPENROUTER_API_KEY = ""
 
+try:
+    # 可指向本地 stub server 做測試
+    OPENROUTER_ENDPOINT = st.secrets["OPENROUTER_URL"]
+except:
+    OPENROUTER_ENDPOINT = OPENROUTER_URL
+
+try:
+    WEATHER_ENDPOINT = st.secrets["WEATHER_URL"]
+except:
+    WEATHER_ENDPOINT = weather.WEATHER_URL
+
+LLM_HEDGED = True
+LLM_HEDGE_DELAY = 2.0  # 秒：第一個 model 未回應就並行試下一個
+try:
+    LLM_CACHE_TTL = int(st.secrets["LLM_CACHE_TTL"])   # 秒；設 0 = 唔用回覆快取
+except:
+    LLM_CACHE_TTL = 6 * 60 * 60
+LLM_CACHE_MAX_ENTRIES = 500
+try:
+    LLM_MAX_CONCURRENT = int(st.secrets["LLM_MAX_CONCURRENT"])   # 全 process 同時最多幾多個對話 call，多咗排隊
+except:
+    LLM_MAX_CONCURRENT = 4
+CHAT_POLL_SECONDS = 0.5   # 對話框幾耐睇一次背景 job 進度
+
+@st.cache_resource
+def get_store():
+    return WardrobeStore()
+
 # --- 4. 初始化 Session State ---
-if 'wardrobe' not in st.session_state:
-    st.session_state.wardrobe = [] 
+# 衣櫃 ID 放喺網址 (?closet=...)，收藏條連結下次就返到同一個衣櫃
+if 'session_uid' not in st.session_state:
+    # 共用圖片快取用嚟分開計每個 session 嘅用量
+    st.session_state.session_uid = uuid.uuid4().hex
+
+if 'closet_id' not in st.session_state:
+    closet_id = st.query_params.get("closet")
+    if not closet_id:
+        closet_id = uuid.uuid4().hex[:12]
+        st.query_params["closet"] = closet_id
+    st.session_state.closet_id = closet_id
 
-# --- 試身室狀態管理 ---
+if not isinstance(st.session_state.get('wardrobe'), WardrobeIndex):
+    # 只載入 metadata；圖片要用先由 disk 讀
+    st.session_state.wardrobe = WardrobeIndex(get_store().list_items(st.session_state.closet_id))
+
+# --- 試身室狀態管理 (wearing_* 存嘅係單品 sid) ---
 if 'show_fitting_room' not in st.session_state:
     st.session_state.show_fitting_room = False 
 if 'wearing_top' not in st.session_state:
@@ -98,7 +157,7 @@ if 'user_profile' not in st.session_state:
 if 'stylist_profile' not in st.session_state:
     st.session_state.stylist_profile = {
         "name": "Kelly", 
-        "avatar_image": None, 
+        "avatar_sha": None,   # 頭像同衣物一樣存做 blob，session 只記 hash
         "persona": "一位貼心的專業形象顧問，語氣親切、專業。",
         "last_preset": "專業顧問", 
         "weather_cache": "查詢中..."
@@ -107,157 +166,416 @@ if 'stylist_profile' not in st.session_state:
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
+if 'chat_open' not in st.session_state:
+    # 對話框開住：背景回覆完成後 rerun 都要再打開佢
+    st.session_state.chat_open = False
+
 if 'uploader_key' not in st.session_state:
     st.session_state.uploader_key = 0
 
+if 'upload_report' not in st.session_state:
+    st.session_state.upload_report = None
+
+# --- 效能量度 (隱藏：網址加 ?debug=1 先開) ---
+# 每次 rerun 一個 RunMetrics；關閉時所有 span / counter 都係 no-op
+METRICS_HISTORY = 50
+if 'debug' not in st.session_state:
+    st.session_state.debug = st.query_params.get("debug") == "1"
+if 'metrics_runs' not in st.session_state:
+    st.session_state.metrics_runs = deque(maxlen=METRICS_HISTORY)
+
+def start_run_metrics(scope="app"):
+    runs = st.session_state.metrics_runs
+    m = telemetry.RunMetrics(enabled=st.session_state.debug, run_id=runs[-1].run_id + 1 if runs else 0, scope=scope)
+    if m.enabled: runs.append(m)
+    st.session_state.run_metrics = m
+    return m
+
+def run_metrics():
+    return st.session_state.run_metrics
+
+start_run_metrics()
+
 # --- 5. 核心函式 ---
 
+@st.cache_resource
+def get_weather_cache():
+    # 全 process 按城市共用；render 時只讀快取，過期就喺背景更新
+    return weather.WeatherCache(url=WEATHER_ENDPOINT)
+
+def get_weather_data(city):
+    return get_weather_cache().get(city)
+
 def get_real_weather(city, user_name="User"):
-    coords = {
-        "香港": {"lat": 22.3193, "lon": 114.1694},
-        "台北": {"lat": 25.0330, "lon": 121.5654},
-        "東京": {"lat": 35.6762, "lon": 139.6503},
-        "首爾": {"lat": 37.5665, "lon": 126.9780},
-        "倫敦": {"lat": 51.5074, "lon": -0.1278}
-    }
-    
-    default_msg = f"Hi {user_name}, {city} 天氣不錯！"
-    
-    if city not in coords: return default_msg
-    try:
-        lat, lon = coords[city]["lat"], coords[city]["lon"]
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,weather_code&timezone=auto"
-        res = requests.get(url, timeout=5)
-        data = res.json()
-        
-        temp = data['current']['temperature_2m']
-        wcode = data['current']['weather_code']
-        
-        condition_msg = "天氣不錯"
-        if wcode <= 3:
-            condition_msg = "天晴，心情都要靚靚！"
-        elif wcode in [45, 48]:
-            condition_msg = "有霧，出門小心。"
-        elif wcode in [51, 53, 55, 61, 63, 65, 80, 81, 82]:
-            condition_msg = "出面落緊雨，記得帶遮呀！"
-        elif wcode >= 95:
-            condition_msg = "有雷暴，留在室內安全啲！"
-        
-        return f"Hi {user_name}, {city}依家 {temp}°C, {condition_msg}"
-        
-    except:
-        return f"Hi {user_name}, {city} 暫時無法連線。"
+    with run_metrics().span("weather"):
+        cache = get_weather_cache()
+        return weather.greeting(city, user_name, cache.get(city), cache.failed(city))
 
-def encode_image(image):
-    buffered = io.BytesIO()
-    image = image.convert('RGB')
-    image.thumbnail((512, 512))
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+def current_temperature():
+    entry = get_weather_data(st.session_state.user_profile['location'])
+    return entry['temp'] if entry else None
 
-def ask_openrouter_direct(text_prompt, image_list=None):
-    if not OPENROUTER_API_KEY:
-        return generate_mock_response()
-        
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY.strip()}",
-        "HTTP-Referer": "https://localhost:8501",
-        "X-Title": "My Stylist App",
-        "Content-Type": "application/json"
-    }
+# --- 已編碼圖片快取 ---
+# 縮圖 base64 / contact sheet 放喺全 process 共用嘅 SharedImageCache (按內容 hash，跨 session 去重)
+# 特徵呢類細嘢就用返下面嘅 LRUCache
+IMAGE_CACHE_MAX_BYTES = 96 * 1024 * 1024
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data: return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= len(self._data.pop(key))
+            self._data[key] = value
+            self.total_bytes += len(value)
+            while self.total_bytes > self.max_bytes and len(self._data) > 1:
+                _, old = self._data.popitem(last=False)
+                self.total_bytes -= len(old)
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= len(self._data.pop(key))
+
+    def __len__(self):
+        return len(self._data)
+
+@st.cache_resource
+def get_image_cache():
+    # 全 process 一個，有總上限；contact sheet 踢出去會寫落 closet_data/cache
+    return SharedImageCache(IMAGE_CACHE_MAX_BYTES, spill_dir=os.path.join(get_store().root, "cache"))
+
+def image_b64_key(sha):
+    return f"b64:{sha}:{LLM_SIZE}"
+
+def get_item_b64(item):
+    def load():
+        run_metrics().incr("encode.miss")
+        with run_metrics().span("encode"):
+            return base64.b64encode(get_store().derived_bytes(item['sha'], LLM_SIZE)).decode('utf-8')
+    return get_image_cache().get(image_b64_key(item['sha']), st.session_state.session_uid, load=load)
+
+def item_image(item):
+    # 顯示用縮圖 (disk 上嘅 JPEG 路徑)，唔會將原圖 decode 入 session
+    return get_store().derived_path(item['sha'], DISPLAY_SIZE)
+
+def invalidate_item_cache(item):
+    # 內容以 hash 做 key，其他 session 可能仲用緊同一張圖，所以只係放低呢個 session 嘅引用
+    get_image_cache().release(st.session_state.session_uid, image_b64_key(item['sha']))
+
+def avatar_path(s):
+    return get_store().derived_path(s['avatar_sha'], DISPLAY_SIZE) if s.get('avatar_sha') else None
+
+# --- 視覺特徵 & 檢索 ---
+@st.cache_resource
+def get_feature_cache():
+    # sha -> features.pack() bytes，每件幾百 byte
+    return LRUCache(8 * 1024 * 1024)
+
+def get_item_features(items):
+    cache = get_feature_cache()
+    packed = {}
+    missing = []
+    for item in items:
+        blob = cache.get(item['sha'])
+        if blob is None: missing.append(item['sha'])
+        else: packed[item['sha']] = blob
+    if missing:
+        store = get_store()
+        found = store.get_features(set(missing))
+        for sha in missing:
+            if sha not in found:
+                # 舊單品未有特徵：由 512px 縮圖補計一次
+                img = Image.open(store.derived_path(sha, LLM_SIZE))
+                found[sha] = features.pack(features.compute(img))
+                store.put_features(sha, found[sha])
+            cache.put(sha, found[sha])
+            packed[sha] = found[sha]
+    return [features.unpack(packed[item['sha']]) for item in items]
+
+def select_chat_items(query):
+    # 揀最相關嘅幾件 (有 byte 上限) 送圖，唔再係「頭 5 件」
+    items = list(st.session_state.wardrobe)
+    if not items: return [], []
+    feats = get_item_features(items)
+    temp = current_temperature()
+    picked = retrieval.select_items(items, feats, query, retrieval.season_for_temperature(temp),
+                                    size_of=lambda item: len(get_item_b64(item)))
+    by_id = {item['id']: f for item, f in zip(items, feats)}
+    return picked, [by_id[item['id']] for item in picked]
+
+# --- Contact sheet 模式 ---
+def select_sheet_items(query):
+    # 放得落就成個衣櫃；太多就按檢索分數揀頭幾百件
+    items = list(st.session_state.wardrobe)
+    feats = get_item_features(items)
+    cap = contact_sheet.sheet_capacity()
+    if len(items) > cap:
+        temp = current_temperature()
+        scores = retrieval.score_items(items, feats, query, retrieval.season_for_temperature(temp))
+        keep = sorted(sorted(range(len(items)), key=lambda i: -scores[i])[:cap])
+        items, feats = [items[i] for i in keep], [feats[i] for i in keep]
+    return items, feats
+
+def get_contact_sheets(items):
+    # 以 (sid, sha) 組合做 key：衣櫃冇變就直接用返上次砌好嘅拼圖
+    key = "sheet:" + hashlib.sha256(repr([(x['sid'], x['sha']) for x in items]).encode()).hexdigest()
+    def render():
+        store = get_store()
+        entries = [(f"[ID: {x['sid']}]", lambda sha=x['sha']: Image.open(store.derived_path(sha, DISPLAY_SIZE)))
+                   for x in items]
+        sheets = contact_sheet.render_sheets(entries)
+        return "\n".join(base64.b64encode(b).decode('utf-8') for b in sheets)
+    packed = get_image_cache().get(key, st.session_state.session_uid, load=render, spillable=True)
+    return packed.split("\n") if packed else []
+
+# --- 成套搭配合成圖 (試身室 / 對話建議 / 送畀 model) ---
+def get_outfit_b64(items):
+    # 以 (sid, sha, 分類) 做 key：同一套衫喺任何 session 都只砌一次
+    key = "outfit:" + hashlib.sha256(repr([(x['sid'], x['sha'], x['category']) for x in items]).encode()).hexdigest()
+    def render():
+        store = get_store()
+        main, side = composite.arrange(items)
+        entry = lambda x: (f"[ID: {x['sid']}]", lambda sha=x['sha']: Image.open(store.derived_path(sha, DISPLAY_SIZE)))
+        run_metrics().incr("outfit.render.items", len(items))
+        with run_metrics().span("outfit.render"):
+            jpeg = composite.render_outfit([entry(x) for x in main], [entry(x) for x in side])
+        return base64.b64encode(jpeg).decode('utf-8')
+    return get_image_cache().get(key, st.session_state.session_uid, load=render)
+
+def outfit_image(items):
+    return base64.b64decode(get_outfit_b64(items))
+
+def worn_items():
+    # 試身室而家著緊嘅 (上身, 下身)，冇就 None
+    wardrobe = st.session_state.wardrobe
+    return wardrobe.get(st.session_state.wearing_top), wardrobe.get(st.session_state.wearing_bottom)
+
+@st.cache_resource
+def get_llm_client():
+    # 全 process 共用一個連線池，model 健康數據亦跨 session 累積
+    # 每個對話 job 嘅 hedged call 最多同時射晒幾個 model (標籤用 get_tag_client，唔佔呢度)
+    return OpenRouterClient(OPENROUTER_API_KEY.strip(), url=OPENROUTER_ENDPOINT,
+                            hedged=LLM_HEDGED, hedge_delay=LLM_HEDGE_DELAY,
+                            max_workers=max(8, LLM_MAX_CONCURRENT * 3))
+
+def build_content_parts(text_prompt, item_list=None, images=None):
+    # images: 已經 encode 好嘅 base64 JPEG (例如 contact sheet)
     content_parts = [{"type": "text", "text": text_prompt}]
     
-    if image_list:
-        selected_imgs = image_list[:5] 
-        for img in selected_imgs:
-            b64 = encode_image(img)
-            content_parts.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{b64}"}
-            })
-    
-    models_to_try = [
-        "google/gemini-2.0-flash-exp:free",
-        "google/gemini-1.5-flash:free",
-        "meta-llama/llama-3.2-11b-vision-instruct:free",
-    ]
-    
-    for model in models_to_try:
-        payload = {
-            "model": model, 
-            "messages": [{"role": "user", "content": content_parts}],
-            "temperature": 0.7
-        }
-        try:
-            response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=15)
-            if response.status_code == 200:
-                data = response.json()
-                if 'choices' in data and len(data['choices']) > 0:
-                    content = data['choices'][0]['message']['content']
-                    if content: return content
-            time.sleep(1)
-        except:
-            pass
-            
-    return generate_mock_response()
+    b64_list = [get_item_b64(item) for item in item_list or []] + list(images or [])
+    for b64 in b64_list:
+        content_parts.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{b64}"}
+        })
+    return content_parts
+
+@st.cache_resource
+def get_response_cache():
+    # 全 process 共用，存喺 closet_data/llm_cache.db (重開都仲喺度)
+    return ResponseCache(os.path.join(get_store().root, "llm_cache.db"),
+                         ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+
+def response_key(text_prompt, item_list=None, images=None):
+    # 逐件附圖用 sha；已 encode 嘅圖 (contact sheet) 直接 hash 佢嘅 base64
+    image_hashes = [item['sha'] for item in item_list or []]
+    image_hashes += [hashlib.sha256(b64.encode()).hexdigest() for b64 in images or []]
+    return make_key(text_prompt, st.session_state.stylist_profile['persona'], image_hashes)
+
+def cached_reply(key):
+    if not LLM_CACHE_TTL: return None
+    reply = get_response_cache().get(key)
+    run_metrics().incr("llm.cache_hit" if reply else "llm.cache_miss")
+    return reply
+
+@st.cache_resource
+def get_chat_runner():
+    return ChatRunner(max_active=LLM_MAX_CONCURRENT)
+
+def chat_work(text_prompt, item_list=None, images=None, stream=False):
+    # 喺主 thread 準備好 (要用 session_state 嘅：附圖、persona、metrics)，
+    # 回傳畀背景 job 跑嘅 work(job)：yield 回覆文字；冇 model 回覆就乜都唔 yield (job.fallback)
+    if not OPENROUTER_API_KEY:
+        return lambda job: iter(())
+    key = response_key(text_prompt, item_list, images)
+    if reply := cached_reply(key):
+        return lambda job: iter([reply])
+    parts = build_content_parts(text_prompt, item_list, images)
+    client, metrics = get_llm_client(), run_metrics()
+    cache = get_response_cache() if LLM_CACHE_TTL else None
+
+    def work(job):
+        if stream:
+            got = []
+            for delta in client.stream_chat(parts, metrics=metrics, cancel=job.cancel):
+                got.append(delta)
+                yield delta
+            # 收到 [DONE] 先會行到呢度 (中途斷線 stream_chat 會 raise)；取消咗亦唔存半截
+            if got and cache and not job.cancel.is_set(): cache.put(key, "".join(got))
+            return
+        with metrics.span("llm.chat"):
+            content = client.chat(parts, metrics=metrics, cancel=job.cancel)
+        if content:
+            if cache: cache.put(key, content)
+            yield content
+    return work
 
 # --- AI 備用邏輯 ---
-def generate_mock_response():
+def generate_mock_response(prefix="⚠️ (AI 連線繁忙，切換至備用線路)\n\n"):
+    # 本地配搭：顏色 + 季節 + 氣溫打分，同一個衣櫃同一個天氣一定得出同一個答案
     wardrobe = st.session_state.wardrobe
     if not wardrobe:
         return "⚠️ (AI 忙線中) 你的衣櫃還是空的，快去加點衣服吧！"
     
-    tops_indices = [i for i, x in enumerate(wardrobe) if x['category'] in ["上衣", "外套", "連身裙"]]
-    bottoms_indices = [i for i, x in enumerate(wardrobe) if x['category'] in ["下身", "褲", "裙"]]
+    items = list(wardrobe)
+    temp = current_temperature()
+    run_metrics().incr("recommend.items", len(items))
+    with run_metrics().span("recommend"):
+        outfits = recommender.recommend(items, get_item_features(items), temp, n=3)
 
-    if not tops_indices or not bottoms_indices:
-        pick_idx = random.choice(range(len(wardrobe)))
-        return f"⚠️ (AI 連線繁忙) 建議你穿上 [ID: {pick_idx}]，但我找不到完整的上衣+褲子搭配，記得去補貨喔！"
+    if not outfits:
+        pick_idx = items[-1]['sid']
+        return f"{prefix}建議你穿上 [ID: {pick_idx}]，但我找不到完整的上衣+褲子搭配，記得去補貨喔！"
 
-    t_idx = random.choice(tops_indices)
-    b_idx = random.choice(bottoms_indices)
-    
-    ids_str = f"[ID: {t_idx}] + [ID: {b_idx}]"
-    
-    msgs = [
-        f"⚠️ (AI 連線繁忙，切換至備用線路)\n\n這種天氣，我覺得 {ids_str} 是絕配！試試看？",
-        f"⚠️ (AI 正在休息)\n\n不用想太多，直接穿 {ids_str} 出門吧，簡單又好看。",
-        f"⚠️ (系統忙碌中)\n\n幫你挑了 {ids_str}，這一套絕對安全不出錯。"
-    ]
-    return random.choice(msgs)
+    lines = []
+    for n, outfit in enumerate(outfits, 1):
+        lines.append(f"{n}. " + " + ".join(f"[ID: {sid}]" for sid in outfit['ids']))
+    weather_str = f"今日 {temp}°C，" if temp is not None else ""
+    return f"{prefix}{weather_str}幫你揀咗以下配搭：\n\n" + "\n".join(lines)
 
 def extract_ids_from_text(text):
     ids = re.findall(r"ID[:：]\s*(\d+)", text, re.IGNORECASE)
     return [int(id_str) for id_str in ids]
 
+def extract_outfits(text):
+    # 一行有兩件或以上 = 一套 (例如 "1. [ID: 3] + [ID: 8]")；回傳 (成套 [[sid, ...]], 散件 [sid])
+    wardrobe = st.session_state.wardrobe
+    outfits, used = [], set()
+    for line in text.splitlines():
+        ids = [i for i in dict.fromkeys(extract_ids_from_text(line)) if i in wardrobe]
+        if len(ids) >= 2 and ids not in outfits:
+            outfits.append(ids)
+            used.update(ids)
+    singles = [i for i in dict.fromkeys(extract_ids_from_text(text)) if i in wardrobe and i not in used]
+    return outfits, singles
+
+def extract_complete_ids(text):
+    # 串流途中用：數字後面要已經出現非數字字元先算完整 (避免 "ID: 1" 其實係 "ID: 12")
+    ids = re.findall(r"ID[:：]\s*(\d+)(?=\D)", text, re.IGNORECASE)
+    return [int(id_str) for id_str in ids]
+
+@st.cache_resource
+def get_ingest_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="ingest")
+
+# --- AI 自動標籤 (背景 batch；冇 API key 就只用本地顏色特徵) ---
+@st.cache_resource
+def get_tag_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="tagging")
+
+@st.cache_resource
+def get_tag_client():
+    # 標籤自己一個 client：唔 hedge (一個 batch 幾張圖，慢過 hedge_delay 就重送會食多幾倍額度)，
+    # 失敗亦唔會影響對話用嘅 model 次序
+    return OpenRouterClient(OPENROUTER_API_KEY.strip(), url=OPENROUTER_ENDPOINT, hedged=False, max_workers=2)
+
+@st.cache_resource
+def get_tagger():
+    return tagging.Tagger(get_store(), get_tag_client(), get_tag_executor())
+
+def schedule_tagging(items):
+    if not OPENROUTER_API_KEY or not items: return
+    cache, store = get_image_cache(), get_store()
+    def load_b64(sha):
+        # 喺背景 thread 行，唔可以掂 session_state
+        return cache.get(image_b64_key(sha),
+                         load=lambda: base64.b64encode(store.derived_bytes(sha, LLM_SIZE)).decode('utf-8'))
+    get_tagger().schedule([x['sha'] for x in items], load_b64)
+
 def process_upload(files, category, season):
     if not files: return
-    for file in files:
-        try:
-            img = Image.open(file)
-            st.session_state.wardrobe.append({
-                'id': str(uuid.uuid4()), 
-                'image': img, 
-                'category': category, 
-                'season': season, 
-                'size_data': {'length': '', 'width': '', 'waist': ''}
-            })
-        except: pass
+    store = get_store()
+    wardrobe = st.session_state.wardrobe
+    existing = list(wardrobe)
+
+    bar = st.progress(0.0, text=f"處理中 0/{len(files)}")
+    accepted, duplicates, failures = ingest.ingest(
+        [(f.name, f.getvalue()) for f in files], store, get_ingest_executor(),
+        known_shas={x['sha'] for x in existing}, known_features=get_item_features(existing),
+        on_progress=lambda done, total: bar.progress(done / total, text=f"處理中 {done}/{total}"))
+
+    feature_cache = get_feature_cache()
+    for res in accepted:
+        item = {
+            'id': str(uuid.uuid4()), 
+            'sha': res['sha'], 
+            'category': category, 
+            'season': season, 
+            'size_data': {'length': '', 'width': '', 'waist': ''}
+        }
+        store.add_item(st.session_state.closet_id, item)
+        store.put_features(res['sha'], res['feat'])
+        feature_cache.put(res['sha'], res['feat'])
+        get_item_b64(item)
+        wardrobe.add(item)
+    schedule_tagging([{'sha': res['sha']} for res in accepted])
+
+    # 結果留到下次 rerun 顯示 (file_uploader 要換 key 先會清空)
+    st.session_state.upload_report = {"added": len(accepted), "duplicates": duplicates, "failures": failures}
+    st.session_state.uploader_key += 1
+    st.rerun()
+
+def process_import(file):
+    # zip 封存檔：圖 / 縮圖 / 特徵 / 標籤都係現成，逐件寫入，唔使 decode
+    store = get_store()
+    wardrobe = st.session_state.wardrobe
+    bar = st.progress(0.0, text="匯入中...")
+    try:
+        added, duplicates, failures = archive.import_items(
+            store, st.session_state.closet_id, file, CATEGORIES, SEASONS,
+            known_shas={x['sha'] for x in wardrobe},
+            on_progress=lambda done, total: bar.progress(done / total, text=f"匯入中 {done}/{total}"))
+    except ValueError as e:
+        added, duplicates, failures = [], [], [(file.name, str(e))]
+    for item in added:
+        wardrobe.add(item)
+    schedule_tagging(added)
+    st.session_state.upload_report = {"added": len(added), "duplicates": duplicates, "failures": failures}
     st.session_state.uploader_key += 1
-    st.toast(f"✅ 已加入 {len(files)} 件", icon="🧥")
-    time.sleep(0.5)
     st.rerun()
 
+def show_upload_report():
+    report = st.session_state.upload_report
+    if not report: return
+    st.session_state.upload_report = None
+    if report["added"]: st.toast(f"✅ 已加入 {report['added']} 件", icon="🧥")
+    if report["duplicates"]:
+        st.info("略過重複相片：" + "、".join(f"{n} ({why})" for n, why in report["duplicates"]))
+    if report["failures"]:
+        st.error("以下相片處理失敗：\n" + "\n".join(f"- {n}: {err}" for n, err in report["failures"]))
+
 # --- 6. Dialogs (編輯 & 設定) ---
 
 @st.dialog("✏️ 編輯單品")
-def edit_item_dialog(item, real_id):
-    st.caption(f"正在編輯 Item [ID: {real_id}]")
+def edit_item_dialog(item):
+    st.caption(f"正在編輯 Item [ID: {item['sid']}]")
     c1, c2 = st.columns([1, 1])
-    with c1: st.image(item['image'])
+    with c1: st.image(item_image(item))
     with c2:
         uid = item['id']
+        before = json.dumps([item.get('category'), item.get('season'), item.get('size_data')], ensure_ascii=False)
         current_cat = item.get('category', '上衣')
         if current_cat not in CATEGORIES: current_cat = CATEGORIES[0]
         
@@ -284,9 +602,16 @@ def edit_item_dialog(item, real_id):
         else:
             item['size_data']['width'] = st.text_input("備註", value=item['size_data'].get('width',''), key=f"rem_{uid}")
         
+        after = json.dumps([item.get('category'), item.get('season'), item.get('size_data')], ensure_ascii=False)
+        if after != before:
+            get_store().update_item(item)
+            st.session_state.wardrobe.update(item)
+        
         st.divider()
         if st.button("🗑️ 刪除", type="primary", key=f"del_{uid}"):
             st.session_state.wardrobe.remove(item)
+            get_store().delete_item(item)
+            invalidate_item_cache(item)
             st.rerun()
 
 @st.dialog("⚙️ 設定")
@@ -315,7 +640,7 @@ def settings_dialog():
     s = st.session_state.stylist_profile
     s['name'] = st.text_input("Stylist 名字", value=s['name'])
     f = st.file_uploader("更換頭像 (長方形效果最佳)", type=['png','jpg'])
-    if f: s['avatar_image'] = f.getvalue()
+    if f: s['avatar_sha'] = get_store().put_blob(f.getvalue())
     
     presets = {
         "專業顧問": "一位貼心的專業形象顧問，語氣親切、專業。",
@@ -340,65 +665,242 @@ def settings_dialog():
         s['last_preset'] = sel_p
     
     s['persona'] = st.text_area("指令 (可手動修改)", value=s['persona'])
+    s['stream_reply'] = st.toggle("⚡ 串流回覆 (逐字顯示)", value=s.get('stream_reply', False))
+    s['local_only'] = st.toggle("🚀 快速模式 (本地配搭，唔經 AI)", value=s.get('local_only', False))
+    s['contact_sheet'] = st.toggle("🗂️ 拼圖模式 (一次過睇晒成個衣櫃)", value=s.get('contact_sheet', False))
+    if LLM_CACHE_TTL:
+        rc = get_response_cache().stats()
+        st.caption(f"♻️ 重複問題直接用返上次答案：命中率 {rc['hit_rate']:.0%} ({rc['hits']}/{rc['hits'] + rc['misses']})，已存 {rc['entries']} 條")
     
     if st.button("完成", type="primary"): st.rerun()
 
-@st.dialog("💬 與 Stylist 對話", width="large")
+CHAT_HISTORY_MAX = 100     # session 最多留幾多條訊息
+CHAT_RENDER_RECENT = 8     # 對話框完整顯示 (連圖) 最近幾條
+
+def cancel_chat():
+    # 取消未答完嘅問題：call 唔使再等，問題亦由紀錄移走 (唔會留低冇答案、又入埋下一輪 prompt)
+    runner, uid = get_chat_runner(), st.session_state.session_uid
+    job = runner.get(uid)
+    if job is None or not runner.cancel(uid): return
+    runner.pop(uid, job)
+    history = st.session_state.chat_history
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == job.question:
+        history.pop()
+
+def close_chat():
+    # 閂咗對話框：未答完嘅 call 唔使再等
+    st.session_state.chat_open = False
+    cancel_chat()
+
+@st.dialog("💬 與 Stylist 對話", width="large", on_dismiss=close_chat)
 def chat_dialog():
+    st.session_state.chat_open = True
     s = st.session_state.stylist_profile
-    p = st.session_state.user_profile
     c1, c2 = st.columns([1, 4])
     with c1:
-        if s['avatar_image']: st.image(s['avatar_image'])
+        if s.get('avatar_sha'): st.image(avatar_path(s))
         else: st.image("https://cdn-icons-png.flaticon.com/512/6833/6833605.png", width=60)
     with c2:
         st.subheader(s['name'])
         st.caption(s['weather_cache'])
     st.divider()
-    for msg in st.session_state.chat_history:
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
-            if "related_ids" in msg and msg["related_ids"]:
-                cols = st.columns(len(msg["related_ids"]))
-                for idx, item_id in enumerate(msg["related_ids"]):
-                    if 0 <= item_id < len(st.session_state.wardrobe):
-                        with cols[idx]:
-                            item = st.session_state.wardrobe[item_id]
-                            st.image(item['image'], caption=f"ID: {item_id}")
+    # 只完整顯示最近幾條；舊嘅摺埋、唔出圖，長對話都唔會越開越慢
+    history = st.session_state.chat_history
+    older, recent = history[:-CHAT_RENDER_RECENT], history[-CHAT_RENDER_RECENT:]
+    if older:
+        with st.expander(f"較早對話 ({len(older)} 條)"):
+            for msg in older:
+                who = "🙋" if msg["role"] == "user" else "💁"
+                st.markdown(f"{who} {prompt_builder.clip(msg['content'], 120)}")
+    for msg in recent:
+        show_message(msg)
     if user_in := st.chat_input("想問咩？"):
-        st.session_state.chat_history.append({"role": "user", "content": user_in})
-        with st.chat_message("user"): st.write(user_in)
+        run_chat_turn(user_in)
+    if get_chat_runner().get(st.session_state.session_uid):
+        chat_pending()
+
+def wardrobe_digest():
+    # {"lines": sid -> 一行文字描述, "untagged": 未有 AI 標籤嘅單品}
+    # 衣櫃冇改動、又冇新標籤 (tagger.version 唔變) 就唔使重新計
+    wardrobe = st.session_state.wardrobe
+    def build():
+        items = list(wardrobe)
+        tags = get_store().get_tags({x['sha'] for x in items})
+        lines, untagged = {}, []
+        for item, feat in zip(items, get_item_features(items)):
+            if item['sha'] in tags:
+                desc = tagging.describe(tags[item['sha']])
+            else:
+                desc = features.describe(feat)
+                untagged.append(item)
+            lines[item['sid']] = prompt_builder.item_line(item, desc)
+        return {"lines": lines, "untagged": untagged}
+    stamp = get_tagger().version if OPENROUTER_API_KEY else None
+    return wardrobe.memo("digest", build, stamp)
+
+def rank_items(query):
+    # 成個衣櫃按檢索分數排；prompt 放唔晒嘅時候截走嘅係最唔相關嗰啲
+    items = list(st.session_state.wardrobe)
+    if not items: return []
+    scores = retrieval.score_items(items, get_item_features(items), query,
+                                   retrieval.season_for_temperature(current_temperature()))
+    order = sorted(range(len(items)), key=lambda i: (-scores[i], items[i]['sid']))
+    return [items[i] for i in order]
+
+def build_chat_request(user_in):
+    # 回傳 (prompt, 逐件附圖嘅單品, 已 encode 嘅額外圖片)
+    s = st.session_state.stylist_profile
+    p = st.session_state.user_profile
+    body_info = f"{p['height']}cm/{p['weight']}kg"
+    header = f"你是{s['name']}。{s['persona']}\n用戶：{p['name']} ({body_info}), {s['weather_cache']}。"
+    rules = "**規則：建議單品時，必須明確標註 [ID: 數字]，只可以用以下清單入面嘅單品。**"
+    digest = wardrobe_digest()
+    lines = digest['lines']
+    # 舊單品 / 上次標籤失敗嘅，順手喺背景補標
+    schedule_tagging(digest['untagged'])
+    # chat_history 最後一條就係今次嘅問題
+    history = prompt_builder.compact_history(st.session_state.chat_history[:-1])
+
+    if s.get('contact_sheet'):
+        # 拼圖模式：一兩張有 [ID: n] 標籤嘅拼圖代替逐件圖
+        picks, _ = select_sheet_items(user_in)
+        images = get_contact_sheets(picks)
+        title = "衣櫃清單 (附圖係拼圖，每格左上角有 [ID: 數字] 標籤)："
+        attached, item_list = [], []
+        on_sheet = {x['sid'] for x in picks}
+        catalogue = [lines[x['sid']] for x in picks] + [lines[x['sid']] for x in rank_items(user_in)
+                                                       if x['sid'] not in on_sheet]
+    else:
+        # 有 AI 標籤嘅單品淨係送文字；未標籤、或者用戶明確要睇相先附圖
+        images = None
+        worn = [x for x in worn_items() if x]
+        wants_images = retrieval.query_wants_images(user_in)
+        if wants_images and worn:
+            # 問緊試身室嗰套：一張合成圖代替逐件
+            item_list, images = [], [get_outfit_b64(worn)]
+            title = "衣櫃清單 (附圖係用戶試緊嘅搭配：" + " + ".join(f"[ID: {x['sid']}]" for x in worn) + ")："
+            attached = [f"試緊 {lines[x['sid']]}" for x in worn]
+        else:
+            if wants_images:
+                item_list, _ = select_chat_items(user_in)
+            elif digest['untagged']:
+                untagged = {x['sid'] for x in digest['untagged']}
+                item_list = [x for x in select_chat_items(user_in)[0] if x['sid'] in untagged]
+            else:
+                item_list = []
+            title = "衣櫃清單 (頭幾件按附圖次序)：" if item_list else "衣櫃清單 (按相關度排)："
+            attached = [f"圖{n} {lines[item['sid']]}" for n, item in enumerate(item_list, 1)]
+        picked = {x['sid'] for x in item_list + (worn if images else [])}
+        catalogue = [lines[x['sid']] for x in rank_items(user_in) if x['sid'] not in picked]
+
+    sys_msg, stats = prompt_builder.build_prompt(header, user_in, rules, title, attached, catalogue, history)
+    run_metrics().incr("prompt.tokens", stats['tokens'])
+    run_metrics().incr("prompt.omitted_items", stats['omitted'])
+    return sys_msg, item_list, images
+
+def run_chat_turn(user_in):
+    # 快速模式即刻答；其他交畀背景 job，回傳 job (由 chat_pending 等佢完成)
+    s = st.session_state.stylist_profile
+    # 上一條未答完就再問：當舊嗰條取消；如果啱啱答完 (未 poll 到) 就先寫入紀錄，唔好搞唔見
+    cancel_chat()
+    runner = get_chat_runner()
+    job = runner.get(st.session_state.session_uid)
+    if job and job.finished() and not job.cancel.is_set():
+        finish_chat_turn(job)
+        show_message(st.session_state.chat_history[-1])
+    st.session_state.chat_history.append({"role": "user", "content": user_in})
+    with st.chat_message("user"): st.write(user_in)
+    if s.get('local_only'):
+        # 快速模式：唔經 AI，直接用本地配搭
         with st.chat_message("assistant"):
-            with st.spinner("Stylist 正在思考..."):
-                m = p['measurements']
-                body_info = f"{p['height']}cm/{p['weight']}kg"
-                sys_msg = (f"你是{s['name']}。{s['persona']}\n用戶：{p['name']} ({body_info}), {s['weather_cache']}。\n用戶問：{user_in}\n**規則：建議單品時，必須明確標註 [ID: 數字]。**\n衣櫃清單：")
-                img_list = []
-                for i, item in enumerate(st.session_state.wardrobe):
-                    img_list.append(item['image'])
-                    sys_msg += f"\n- [ID: {i}] {item['category']}"
-                
-                reply = ask_openrouter_direct(sys_msg, img_list)
-                found_ids = extract_ids_from_text(reply)
-                st.write(reply)
-                valid_ids = []
-                if found_ids:
-                    st.caption("✨ 建議搭配：")
-                    cols = st.columns(len(found_ids))
-                    for idx, item_id in enumerate(found_ids):
-                        if 0 <= item_id < len(st.session_state.wardrobe):
-                            valid_ids.append(item_id)
-                            with cols[idx]:
-                                item = st.session_state.wardrobe[item_id]
-                                st.image(item['image'], caption=f"ID: {item_id}")
-                st.session_state.chat_history.append({"role": "assistant", "content": reply, "related_ids": valid_ids})
+            reply = generate_mock_response(prefix="⚡ ")
+            valid_ids, outfits = show_reply_with_items(reply)
+        add_reply(reply, valid_ids, outfits)
+        return None
+    sys_msg, picks, images = build_chat_request(user_in)
+    work = chat_work(sys_msg, picks, images, stream=bool(s.get('stream_reply')))
+    return get_chat_runner().submit(st.session_state.session_uid, user_in, work)
+
+def add_reply(reply, valid_ids, outfits):
+    st.session_state.chat_history.append({"role": "assistant", "content": reply, "related_ids": valid_ids,
+                                          "outfits": outfits})
+    del st.session_state.chat_history[:-CHAT_HISTORY_MAX]
+
+def finish_chat_turn(job):
+    # job 完成 (或者取消咗)：攞結果寫入對話紀錄；本地備用要用 session_state，所以喺呢度先砌
+    get_chat_runner().pop(st.session_state.session_uid, job)
+    if job.cancel.is_set(): return
+    if job.fallback:
+        run_metrics().incr("llm.mock_fallbacks")
+        reply = generate_mock_response()
+    else:
+        reply = job.text()
+    run_metrics().record("llm.turn", job.waited())
+    outfits, _ = extract_outfits(reply)
+    valid_ids = [i for i in dict.fromkeys(extract_ids_from_text(reply)) if i in st.session_state.wardrobe]
+    add_reply(reply, valid_ids, outfits)
+
+@st.fragment(run_every=CHAT_POLL_SECONDS)
+def chat_pending():
+    # 定時睇背景 job：未完就顯示進度 (串流模式連已收到嘅字)，完咗就寫入紀錄再 rerun 重畫成個對話框
+    job = get_chat_runner().get(st.session_state.session_uid)
+    if job is None: return
+    if job.finished():
+        finish_chat_turn(job)
+        st.rerun()
+    with st.chat_message("assistant"):
+        if job.parts:
+            reply = job.text()
+            st.markdown(reply + "▌")
+            wardrobe = st.session_state.wardrobe
+            ids = [i for i in dict.fromkeys(extract_complete_ids(reply)) if i in wardrobe]
+            if ids:
+                st.caption("✨ 建議搭配：")
+                with st.container(horizontal=True):
+                    for item_id in ids:
+                        st.image(item_image(wardrobe.get(item_id)), caption=f"ID: {item_id}", width=150)
+        elif job.state == "queued":
+            st.caption(f"⏳ 排緊隊... ({job.waited():.0f} 秒)")
+        else:
+            st.caption(f"💭 Stylist 正在思考... ({job.waited():.0f} 秒)")
+        st.button("取消", key="chat_cancel", on_click=cancel_chat)
+
+def show_message(msg):
+    with st.chat_message(msg["role"]):
+        st.write(msg["content"])
+        if msg.get("related_ids"):
+            outfits = msg.get("outfits") or []
+            in_outfit = {i for ids in outfits for i in ids}
+            show_suggestions(outfits, [i for i in msg["related_ids"] if i not in in_outfit])
+
+def show_suggestions(outfits, singles):
+    # 成套嘅出一張合成圖，散件照舊逐件顯示
+    wardrobe = st.session_state.wardrobe
+    outfits = [[wardrobe.get(i) for i in ids if i in wardrobe] for ids in outfits]
+    outfits = [items for items in outfits if items]
+    singles = [wardrobe.get(i) for i in singles if i in wardrobe]
+    if not outfits and not singles: return
+    st.caption("✨ 建議搭配：")
+    cols = st.columns(len(outfits) + len(singles))
+    for col, items in zip(cols, outfits):
+        with col: st.image(outfit_image(items), caption=" + ".join(f"ID: {x['sid']}" for x in items))
+    for col, item in zip(cols[len(outfits):], singles):
+        with col: st.image(item_image(item), caption=f"ID: {item['sid']}")
+
+def show_reply_with_items(reply):
+    # 回傳 (出現過嘅有效 sid, 成套)
+    st.write(reply)
+    outfits, singles = extract_outfits(reply)
+    show_suggestions(outfits, singles)
+    valid_ids = [i for i in dict.fromkeys(extract_ids_from_text(reply)) if i in st.session_state.wardrobe]
+    return valid_ids, outfits
 
 # --- 7. 主程式 (Single Column Layout for Mobile) ---
 
-if st.session_state.stylist_profile['weather_cache'] == "查詢中..." or "Hi User" in st.session_state.stylist_profile['weather_cache']:
-    loc = st.session_state.user_profile['location']
-    name = st.session_state.user_profile['name']
-    st.session_state.stylist_profile['weather_cache'] = get_real_weather(loc, name)
+# 每次 rerun 都由共用快取攞 (唔會等網絡)
+loc = st.session_state.user_profile['location']
+name = st.session_state.user_profile['name']
+st.session_state.stylist_profile['weather_cache'] = get_real_weather(loc, name)
 
 # --- 頂部控制面板 (Top Header) - 取代 Sidebar ---
 with st.container():
@@ -409,7 +911,7 @@ with st.container():
     c_head1, c_head2 = st.columns([1, 4], vertical_alignment="center")
     
     with c_head1:
-        if s['avatar_image']: st.image(s['avatar_image'], use_column_width=True)
+        if s.get('avatar_sha'): st.image(avatar_path(s), use_column_width=True)
         else: st.image("https://cdn-icons-png.flaticon.com/512/6833/6833605.png", use_column_width=True)
         
     with c_head2:
@@ -431,63 +933,135 @@ with st.container():
         st.session_state.show_fitting_room = not st.session_state.show_fitting_room
 
     with c_b1:
-        if st.button("💬 開始對話", type="primary", use_container_width=True): chat_dialog()
+        if st.button("💬 開始對話", type="primary", use_container_width=True) or st.session_state.chat_open:
+            chat_dialog()
     
     with c_b2:
         room_btn_label = "🚪 離開試身室" if st.session_state.show_fitting_room else "🎽 進入試身室"
         st.button(room_btn_label, on_click=toggle_fitting_room, use_container_width=True)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # 試身室面板 (Top Display)
-    if st.session_state.show_fitting_room:
-        st.markdown('<div class="fitting-room-box">', unsafe_allow_html=True)
-        st.caption("目前搭配")
-        
-        # 垂直排列
-        if st.session_state.wearing_top is not None and st.session_state.wearing_top < len(st.session_state.wardrobe):
-            st.image(st.session_state.wardrobe[st.session_state.wearing_top]['image'], width=200)
-        else:
-            st.markdown("Waiting<br>Top", unsafe_allow_html=True)
+# --- 試身室 + 衣櫃：包喺同一個 fragment ---
+# 試身 / 翻頁 / 篩選只會 rerun 呢一截，唔會重跑天氣、header，亦唔會重送其他頁嘅圖
+GRID_COLS = 5
+GRID_PAGE_SIZE = 20
 
-        if st.session_state.wearing_bottom is not None and st.session_state.wearing_bottom < len(st.session_state.wardrobe):
-            st.image(st.session_state.wardrobe[st.session_state.wearing_bottom]['image'], width=200)
-        else:
-            st.markdown("Waiting<br>Bottom", unsafe_allow_html=True)
-                
-        st.markdown('</div>', unsafe_allow_html=True)
+if 'grid_page' not in st.session_state:
+    st.session_state.grid_page = 0
+
+def try_on(item):
+    # callback 入面唔畫嘢；toast 留返畀 fragment 本體出
+    if item['category'] in ["上衣", "外套", "連身裙"]:
+        st.session_state.wearing_top = item['sid']
+        st.session_state.try_on_toast = (f"上身已換: ID {item['sid']}", "👚")
+    else:
+        st.session_state.wearing_bottom = item['sid']
+        st.session_state.try_on_toast = (f"下身已換: ID {item['sid']}", "👖")
+
+def set_grid_page(page):
+    st.session_state.grid_page = page
+
+def show_fitting_room():
+    st.markdown('<div class="fitting-room-box">', unsafe_allow_html=True)
+    st.caption("目前搭配")
     
+    # 上下身砌成一張合成圖 (按內容 hash 快取)
+    top, bottom = worn_items()
+    if not top: st.markdown("Waiting<br>Top", unsafe_allow_html=True)
+    if top or bottom: st.image(outfit_image([x for x in (top, bottom) if x]), width=240)
+    if not bottom: st.markdown("Waiting<br>Bottom", unsafe_allow_html=True)
+
     st.markdown('</div>', unsafe_allow_html=True)
 
-# --- 摺疊選單：加入衣櫃 ---
-with st.expander("📥 加入新衣物 (點擊展開)"):
-    cat = st.pills("分類", CATEGORIES, default=CATEGORIES[0], selection_mode="single")
-    sea = st.pills("季節", SEASONS, default=SEASONS[0], selection_mode="single")
-    
-    files = st.file_uploader("圖片", accept_multiple_files=True, key=f"up_{st.session_state.uploader_key}")
-    if files: process_upload(files, cat or CATEGORIES[0], sea or SEASONS[0])
-    
-    if st.button("🗑️ 清空衣櫃"):
-        st.session_state.wardrobe = []
-        st.session_state.wearing_top = None
-        st.session_state.wearing_bottom = None
-        st.rerun()
+def show_grid_page(final_display):
+    # 只畫目前一頁；篩選結果變咗就返去第一頁
+    pages = max(1, -(-len(final_display) // GRID_PAGE_SIZE))
+    page = min(st.session_state.grid_page, pages - 1)
+    page_items = final_display[page * GRID_PAGE_SIZE:(page + 1) * GRID_PAGE_SIZE]
+
+    run_metrics().incr("grid.items", len(page_items))
+    with run_metrics().span("grid"):
+        cols = st.columns(GRID_COLS)
+        for i, item in enumerate(page_items):
+            with cols[i % GRID_COLS]:
+                real_id = item['sid']
+                st.image(item_image(item), caption=f"ID: {real_id}")
+                
+                c_edit, c_try = st.columns([1, 1])
+                with c_edit:
+                    if st.button("✏️", key=f"e_{item['id']}"):
+                          edit_item_dialog(item)
+                
+                with c_try:
+                    st.button("👕", key=f"t_{item['id']}", on_click=try_on, args=(item,))
+
+    if pages > 1:
+        c_prev, c_info, c_next = st.columns([1, 2, 1], vertical_alignment="center")
+        with c_prev:
+            st.button("◀", key="grid_prev", disabled=page == 0, on_click=set_grid_page, args=(page - 1,),
+                      use_container_width=True)
+        with c_info:
+            st.caption(f"第 {page + 1} / {pages} 頁 (共 {len(final_display)} 件)")
+        with c_next:
+            st.button("▶", key="grid_next", disabled=page >= pages - 1, on_click=set_grid_page, args=(page + 1,),
+                      use_container_width=True)
+
+@st.fragment
+def closet_view():
+    # 同一個 RunMetrics 再見到 = 呢次係 fragment 自己 rerun，開過新一個記錄
+    if st.session_state.get('view_metrics') is run_metrics(): start_run_metrics("fragment")
+    st.session_state.view_metrics = run_metrics()
+
+    toast = st.session_state.pop('try_on_toast', None)
+    if toast: st.toast(toast[0], icon=toast[1])
 
-# --- 主畫面：衣櫃列表 ---
-st.subheader("🧥 我的衣櫃")
+    # 試身室面板 (Top Display)
+    if st.session_state.show_fitting_room: show_fitting_room()
 
-season_filter = st.pills("季節篩選", ["全部", "春夏", "秋冬"], default="全部", selection_mode="single")
-if not season_filter: season_filter = "全部"
+    # --- 摺疊選單：加入衣櫃 ---
+    show_upload_report()
+    with st.expander("📥 加入新衣物 (點擊展開)"):
+        cat = st.pills("分類", CATEGORIES, default=CATEGORIES[0], selection_mode="single")
+        sea = st.pills("季節", SEASONS, default=SEASONS[0], selection_mode="single")
+        
+        files = st.file_uploader("圖片", accept_multiple_files=True, key=f"up_{st.session_state.uploader_key}")
+        if files: process_upload(files, cat or CATEGORIES[0], sea or SEASONS[0])
+        
+        st.divider()
+        st.caption("📦 封存檔 (zip)：搬去第二部機 / 備份")
+        c_exp, c_imp = st.columns(2)
+        with c_exp:
+            # 撳先至喺背景 thread 砌 zip (寫入臨時檔)，平時 rerun 唔使做嘢
+            snapshot, store = list(st.session_state.wardrobe), get_store()
+            st.download_button("⬇️ 匯出衣櫃", data=lambda: archive.export_to_tempfile(store, snapshot),
+                               file_name=archive.archive_name(st.session_state.closet_id),
+                               mime="application/zip", disabled=not snapshot, use_container_width=True)
+        with c_imp:
+            zip_file = st.file_uploader("匯入封存檔", type=["zip"], key=f"zip_{st.session_state.uploader_key}",
+                                        label_visibility="collapsed")
+        if zip_file: process_import(zip_file)
 
-if not st.session_state.wardrobe:
-    st.info("👈 點擊上方「加入新衣物」開始！")
-else:
-    filtered_items = []
-    for item in st.session_state.wardrobe:
-        iseason = item.get('season', '四季')
-        if season_filter == "全部": filtered_items.append(item)
-        elif season_filter == "春夏" and iseason in ["四季", "春夏"]: filtered_items.append(item)
-        elif season_filter == "秋冬" and iseason in ["四季", "秋冬"]: filtered_items.append(item)
+        if st.button("🗑️ 清空衣櫃"):
+            for item in st.session_state.wardrobe: invalidate_item_cache(item)
+            get_store().clear(st.session_state.closet_id)
+            st.session_state.wardrobe = WardrobeIndex()
+            st.session_state.wearing_top = None
+            st.session_state.wearing_bottom = None
+            st.rerun()
 
-    cats_available = list(set([x['category'] for x in filtered_items]))
+    # --- 主畫面：衣櫃列表 ---
+    st.subheader("🧥 我的衣櫃")
+
+    season_filter = st.pills("季節篩選", ["全部", "春夏", "秋冬"], default="全部", selection_mode="single")
+    if not season_filter: season_filter = "全部"
+
+    if not st.session_state.wardrobe:
+        st.info("👈 點擊上方「加入新衣物」開始！")
+        return
+
+    # 由索引分桶直接攞，唔使每次 rerun 掃晒成個衣櫃
+    cats_available = st.session_state.wardrobe.categories(season_filter)
     if cats_available:
         st.caption("🔍 篩選分類 (可多選)")
         options = ["全部"] + cats_available
@@ -496,28 +1070,44 @@ else:
         sel = []
 
     if not sel or "全部" in sel:
-        final_display = filtered_items
+        final_display = st.session_state.wardrobe.filter(season_filter)
     else:
-        final_display = [x for x in filtered_items if x['category'] in sel]
-    
-    # 網格顯示
-    cols = st.columns(5)
-    for i, item in enumerate(final_display):
-        with cols[i % 5]:
-            real_id = st.session_state.wardrobe.index(item)
-            st.image(item['image'], caption=f"ID: {real_id}")
-            
-            c_edit, c_try = st.columns([1, 1])
-            with c_edit:
-                if st.button("✏️", key=f"e_{item['id']}"):
-                      edit_item_dialog(item, real_id)
-            
-            with c_try:
-                if st.button("👕", key=f"t_{item['id']}"):
-                    if item['category'] in ["上衣", "外套", "連身裙"]:
-                        st.session_state.wearing_top = real_id
-                        st.toast(f"上身已換: ID {real_id}", icon="👚")
-                    else:
-                        st.session_state.wearing_bottom = real_id
-                        st.toast(f"下身已換: ID {real_id}", icon="👖")
-                    st.rerun()
+        final_display = st.session_state.wardrobe.filter(season_filter, sel)
+
+    filter_key = (season_filter, tuple(sel or ()))
+    if st.session_state.get('grid_filter') != filter_key:
+        st.session_state.grid_filter = filter_key
+        st.session_state.grid_page = 0
+    show_grid_page(final_display)
+
+closet_view()
+
+# --- 效能面板 (?debug=1) ---
+if st.session_state.debug:
+    with st.expander("⏱️ 效能量度"):
+        m = run_metrics()
+        st.caption(f"今次 rerun #{m.run_id}：{m.elapsed() * 1000:.1f} ms")
+        rows = []
+        for r in list(st.session_state.metrics_runs)[-10:]:
+            for span_name, agg in r.summary().items():
+                rows.append({"run": r.run_id, "span": span_name, "count": agg['count'],
+                             "ms": round(agg['seconds'] * 1000, 2)})
+        if rows: st.dataframe(rows, hide_index=True, use_container_width=True)
+        counters = {}
+        for r in st.session_state.metrics_runs:
+            for k, v in r.counters.items(): counters[k] = counters.get(k, 0) + v
+        if counters: st.json(counters)
+        st.caption("AI 回覆快取 / 自動標籤")
+        st.json({"responses": get_response_cache().stats(), "chat_jobs": get_chat_runner().stats(),
+                 "tagging": {"pending": get_tagger().pending(), "version": get_tagger().version}})
+        st.caption("共用圖片快取 (全 process / 今個 session)")
+        st.json({"global": get_image_cache().stats(),
+                 "session": get_image_cache().usage(st.session_state.session_uid)})
+        runs = list(st.session_state.metrics_runs)
+        c_j, c_p = st.columns(2)
+        with c_j:
+            st.download_button("JSONL", telemetry.to_jsonl(runs), file_name="closet_metrics.jsonl",
+                               mime="application/x-ndjson", use_container_width=True)
+        with c_p:
+            st.download_button("Prometheus", telemetry.to_prometheus(runs), file_name="closet_metrics.prom",
+                               mime="text/plain", use_container_width=True)
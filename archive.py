@@ -0,0 +1,193 @@
+import base64
+import io
+import json
+import tempfile
+import uuid
+import zipfile
+
+from PIL import Image
+
+import features
+import tagging
+from wardrobe_store import DISPLAY_SIZE, LLM_SIZE
+
+# --- 衣櫃封存 (zip)：匯出 / 匯入成個衣櫃 ---
+# manifest.jsonl   第一行 {"format", "version", "items"}，之後每件一行
+#                  {"id", "sha", "category", "season", "size_data", "features" (base64), "tags"}
+# images/<sha>.jpg          原圖 (store 入面嗰份，最長邊 1600px)
+# thumbs/<sha>_<size>.jpg   已經縮好嘅 400 / 512px 縮圖，匯入時直接寫落 disk，唔使 decode
+# 逐件讀寫：記憶體入面最多只有一張圖 + manifest 一行
+
+FORMAT = "my-ai-closet"
+VERSION = 1
+MANIFEST = "manifest.jsonl"
+THUMB_SIZES = (DISPLAY_SIZE, LLM_SIZE)
+CHUNK = 1024 * 1024
+DB_BATCH = 200            # 匯入時每幾多件寫一次 DB (一個 transaction)
+
+
+def _copy_file(zf, path, arcname):
+    # JPEG 本身已壓縮，用 ZIP_STORED 慳返 CPU；分段抄，唔會一次過讀入記憶體
+    with open(path, "rb") as src, zf.open(zipfile.ZipInfo(arcname), "w") as dst:
+        while chunk := src.read(CHUNK):
+            dst.write(chunk)
+
+
+def export_items(store, items, fileobj, on_progress=None):
+    # items: list_items() 格式；fileobj: 可寫 + seek 嘅檔案 (例如 tempfile)
+    shas = list(dict.fromkeys(x['sha'] for x in items))
+    feats = store.get_features(shas)
+    tags = store.get_tags(shas)
+    lines = [json.dumps({"format": FORMAT, "version": VERSION, "items": len(items)})]
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_STORED) as zf:
+        written = set()
+        for done, item in enumerate(items, 1):
+            sha = item['sha']
+            if sha not in written:
+                _copy_file(zf, store.blob_path(sha), f"images/{sha}.jpg")
+                for size in THUMB_SIZES:
+                    _copy_file(zf, store.derived_path(sha, size), f"thumbs/{sha}_{size}.jpg")
+                written.add(sha)
+            lines.append(json.dumps({
+                "id": item['id'], "sha": sha, "category": item['category'], "season": item['season'],
+                "size_data": item.get('size_data', {}),
+                "features": base64.b64encode(feats[sha]).decode('ascii') if sha in feats else None,
+                "tags": tags.get(sha),
+            }, ensure_ascii=False))
+            if on_progress: on_progress(done, len(items))
+        zf.writestr(zipfile.ZipInfo(MANIFEST), "\n".join(lines) + "\n", compress_type=zipfile.ZIP_DEFLATED)
+    return len(items)
+
+
+def read_header(zf):
+    # 唔啱格式一律 ValueError
+    with zf.open(MANIFEST) as f:
+        header = json.loads(f.readline() or b"{}")
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("唔係衣櫃封存檔 (缺少 manifest)")
+    version = header.get("version", 0)
+    if not isinstance(version, int): raise ValueError("封存檔版本格式唔啱")
+    if version > VERSION:
+        raise ValueError("封存檔版本太新，請更新 app")
+    if not isinstance(header.get("items", 0), int): header["items"] = 0
+    return header
+
+
+def iter_manifest(zf):
+    # 逐行讀 (未 parse)，唔會一次過 load 成個 manifest；parse 留畀 _parse_entry，錯咗只係嗰件失敗
+    with zf.open(MANIFEST) as f:
+        f.readline()
+        for line in f:
+            if line.strip(): yield line
+
+
+def _parse_entry(line):
+    entry = json.loads(line)
+    if not isinstance(entry, dict): raise ValueError("manifest 呢行格式唔啱")
+    if not isinstance(entry.get("sha"), str): raise ValueError("缺少圖片 hash")
+    return entry
+
+
+def _read_image(zf, arcname):
+    # 圖檔 / 縮圖都要 decode 得到先收，唔係之後每次開衣櫃都會 crash
+    with zf.open(arcname) as f:
+        data = f.read()
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft('RGB', (64, 64))    # JPEG 用 1/8 解析度 decode，快好多，壞檔一樣會 raise
+        img.load()
+    except Exception:
+        raise ValueError(f"{arcname} 唔係有效圖片")
+    return data
+
+
+def _check_entry(entry, categories, seasons):
+    # manifest 唔可信：寫入任何嘢之前先驗；回傳 (item 欄位, features bytes / None, tags dict / None)
+    if entry.get("category") not in categories: raise ValueError("分類唔啱")
+    if entry.get("season") not in seasons: raise ValueError("季節唔啱")
+    size_data = entry.get("size_data") or {}
+    if not isinstance(size_data, dict) or not all(isinstance(v, str) for v in size_data.values()):
+        raise ValueError("尺寸資料格式唔啱")
+    feat = None
+    if entry.get("features"):
+        try:
+            feat = base64.b64decode(entry["features"], validate=True)
+        except (TypeError, ValueError):
+            raise ValueError("特徵資料格式唔啱")
+        if len(feat) != features.PACKED_SIZE: raise ValueError("特徵資料長度唔啱")
+    tags = None
+    if entry.get("tags") is not None:
+        tags = tagging.clean_tags(entry["tags"])
+        if tags is None: raise ValueError("標籤格式唔啱")
+    return {'category': entry["category"], 'season': entry["season"], 'size_data': size_data}, feat, tags
+
+
+def import_items(store, closet, fileobj, categories, seasons, known_shas=(), on_progress=None):
+    # categories / seasons: 容許嘅分類 / 季節；唔啱嘅當失敗
+    # 回傳 (新增嘅 items, 重複 [(id, 原因)], 失敗 [(id, 原因)])
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError("檔案唔係 zip")
+    with zf:
+        names = set(zf.namelist())
+        if MANIFEST not in names:
+            raise ValueError("唔係衣櫃封存檔 (缺少 manifest)")
+        total = read_header(zf).get("items", 0)
+        seen = set(known_shas)
+        added, duplicates, failures = [], [], []
+        batch, feats, tags = [], {}, {}
+
+        def flush():
+            # id 撞咗 (例如同一部機匯入第二個衣櫃) 就換個新 uuid
+            taken = store.has_items(x['id'] for x in batch)
+            for item in batch:
+                if item['id'] in taken: item['id'] = str(uuid.uuid4())
+            added.extend(store.add_items(closet, batch, feats, tags))
+            batch.clear(); feats.clear(); tags.clear()
+
+        try:
+            for done, line in enumerate(iter_manifest(zf), 1):
+                name = f"#{done}"
+                try:
+                    entry = _parse_entry(line)
+                    name = str(entry.get("id") or name)
+                    sha = entry["sha"]
+                    if sha in seen:
+                        duplicates.append((name, "衣櫃已經有"))
+                    else:
+                        fields, feat, tag = _check_entry(entry, categories, seasons)
+                        # 全部驗完先寫：圖檔逐個寫落 disk；DB 留到 flush 先一次過寫
+                        blob = _read_image(zf, f"images/{sha}.jpg")
+                        thumbs = {size: _read_image(zf, f"thumbs/{sha}_{size}.jpg") for size in THUMB_SIZES
+                                  if f"thumbs/{sha}_{size}.jpg" in names}
+                        if store.put_blob(blob) != sha:
+                            raise ValueError("圖片內容同 manifest 唔對應")
+                        for size, data in thumbs.items():
+                            store.put_derived(sha, size, data)
+                        if feat: feats[sha] = feat
+                        if tag: tags[sha] = tag
+                        batch.append(dict(fields, id=str(entry.get("id") or uuid.uuid4()), sha=sha))
+                        seen.add(sha)
+                except (KeyError, TypeError, ValueError, OSError, zipfile.BadZipFile) as e:
+                    failures.append((name, str(e) or e.__class__.__name__))
+                if len(batch) >= DB_BATCH: flush()
+                if on_progress: on_progress(done, max(total, done))
+        except (ValueError, OSError, zipfile.BadZipFile) as e:
+            # manifest 本身讀到一半壞咗：已經匯入嘅照樣回傳
+            failures.append((MANIFEST, str(e) or e.__class__.__name__))
+        finally:
+            if batch: flush()
+    return added, duplicates, failures
+
+
+def archive_name(closet):
+    return f"closet_{closet}.zip"
+
+
+def export_to_tempfile(store, items, tmp_dir=None):
+    # download_button 撳咗先會 call；寫入 disk 上嘅臨時檔，回傳已 seek(0) 嘅 file object
+    f = tempfile.TemporaryFile(dir=tmp_dir)
+    export_items(store, items, f)
+    f.seek(0)
+    return f
@@ -0,0 +1,260 @@
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+from PIL import Image
+
+# --- Headless benchmark：用 Streamlit AppTest 跑 app.py ---
+# 用法：python bench/bench_app.py --sizes 10 100 1000 --out bench_results.json
+# OpenRouter 同 open-meteo 都由本地 stub server 代替，唔會出街
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+import ingest  # noqa: E402
+from wardrobe_store import WardrobeStore  # noqa: E402
+
+CATEGORIES = ["上衣", "下身", "連身裙", "外套", "鞋", "配件"]
+SEASONS = ["四季", "春夏", "秋冬"]
+UPLOAD_BATCH = 20
+GRID_RERUNS = 5
+CHAT_QUESTION = "今日著咩好？想要黑色上衣"
+
+
+# --- Stub server ---
+class StubHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+    tag_requests = []
+    reply = "試下 [ID: 0] + [ID: 1]"
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, obj):
+        out = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(StubHandler.latency)
+        parts = json.loads(body)["messages"][0]["content"]
+        if "衣物標籤助手" in parts[0]["text"]:
+            # 自動標籤 request：每張圖回一個固定標籤 (唔計入對話 payload)
+            StubHandler.tag_requests.append(len(body))
+            n = sum(1 for p in parts if p["type"] == "image_url")
+            tags = [{"colour": "黑色", "material": "棉", "formality": "休閒", "pattern": "純色", "warmth": 2}] * n
+            self._send_json({"choices": [{"message": {"content": json.dumps(tags, ensure_ascii=False)}}]})
+            return
+        StubHandler.requests_seen.append(len(body))
+        self._send_json({"choices": [{"message": {"content": StubHandler.reply}}]})
+
+    def do_GET(self):
+        self._send_json({"current": {"temperature_2m": 18.5, "weather_code": 2}})
+
+
+def start_stub():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_port}/"
+
+
+# --- 合成衣物相 ---
+def synthetic_photo(seed, size=(1200, 1600)):
+    # 低解析度隨機紋理放大：有結構 (唔會被當成重複)，JPEG 大小接近真相
+    rng = np.random.default_rng(seed)
+    small = (rng.random((12, 9, 3)) * 255).astype(np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BICUBIC)
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=85)
+    return buffered.getvalue()
+
+
+class FakeUpload:
+    # 模擬 st.file_uploader 回傳嘅 UploadedFile
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+
+def seed_closet(store, closet, n, offset=0):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        files = [(f"seed_{i}.jpg", synthetic_photo(offset + i)) for i in range(n)]
+        accepted, _, failures = ingest.ingest(files, store, pool)
+    for i, res in enumerate(accepted):
+        item = {'id': str(uuid.uuid4()), 'sha': res['sha'], 'category': CATEGORIES[i % len(CATEGORIES)],
+                'season': SEASONS[i % len(SEASONS)], 'size_data': {}}
+        store.add_item(closet, item)
+        store.put_features(res['sha'], res['feat'])
+    return len(accepted), failures
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# --- AppTest ---
+def make_app(source, closet, stub_url):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_string(source, default_timeout=600)
+    at.query_params["closet"] = closet
+    at.secrets["OPENROUTER_API_KEY"] = "bench"
+    at.secrets["OPENROUTER_URL"] = stub_url
+    at.secrets["WEATHER_URL"] = stub_url
+    return at
+
+
+# 附加喺 app.py 後面嘅量度程式碼；結果寫入 session_state["_bench"]
+UPLOAD_PROBE = """
+import time as _time
+import tracemalloc as _tm
+if "_bench" not in st.session_state:
+    _files = st.session_state.pop("_bench_files")
+    st.session_state["_bench"] = {}
+    _tm.start()
+    _t0 = _time.perf_counter()
+    try:
+        process_upload(_files, CATEGORIES[0], SEASONS[0])
+    finally:
+        st.session_state["_bench"] = {"seconds": _time.perf_counter() - _t0,
+                                      "py_peak_kb": _tm.get_traced_memory()[1] // 1024}
+        _tm.stop()
+"""
+
+CHAT_PROBE = """
+import time as _time
+if "_bench" not in st.session_state:
+    _t0 = _time.perf_counter()
+    _job = run_chat_turn(st.session_state.pop("_bench_question"))
+    # script_s：script 本身阻塞幾耐 (model call 喺背景跑)；seconds：等到回覆寫入紀錄
+    _script = _time.perf_counter() - _t0
+    if _job:
+        _job.future.result()
+        finish_chat_turn(_job)
+    st.session_state["_bench"] = {"seconds": _time.perf_counter() - _t0, "script_s": _script}
+"""
+
+
+def bench_grid(source, closet, stub_url):
+    at = make_app(source, closet, stub_url)
+    t0 = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - t0
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    warm = []
+    for _ in range(GRID_RERUNS):
+        t0 = time.perf_counter()
+        at.run()
+        warm.append(time.perf_counter() - t0)
+    return {"cold_s": round(cold, 4), "rerun_median_s": round(statistics.median(warm), 4),
+            "rerun_max_s": round(max(warm), 4)}
+
+
+def bench_upload(source, closet, stub_url, offset):
+    at = make_app(source + UPLOAD_PROBE, closet, stub_url)
+    at.session_state["_bench_files"] = [FakeUpload(f"new_{i}.jpg", synthetic_photo(offset + i))
+                                        for i in range(UPLOAD_BATCH)]
+    rss0 = rss_kb()
+    at.run()
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    res = at.session_state["_bench"]
+    return {"files": UPLOAD_BATCH, "seconds": round(res["seconds"], 4), "py_peak_kb": res["py_peak_kb"],
+            "rss_delta_kb": rss_kb() - rss0}
+
+
+def bench_chat(source, closet, stub_url):
+    at = make_app(source + CHAT_PROBE, closet, stub_url)
+    at.session_state["_bench_question"] = CHAT_QUESTION
+    StubHandler.requests_seen.clear()
+    at.run()
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    res = at.session_state["_bench"]
+    return {"seconds": round(res["seconds"], 4), "script_s": round(res["script_s"], 4), "requests": len(StubHandler.requests_seen),
+            "payload_bytes": sum(StubHandler.requests_seen)}
+
+
+def wait_for_tags(store, closet, timeout=60):
+    # 第一輪對話會喺背景排自動標籤；等佢哋全部寫入 store
+    shas = {x['sha'] for x in store.list_items(closet)}
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(store.get_tags(shas)) >= len(shas): return True
+        time.sleep(0.1)
+    return False
+
+
+def run(sizes, workdir):
+    srv, stub_url = start_stub()
+    with open(APP_PATH, encoding="utf-8") as f:
+        source = f.read()
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    store = WardrobeStore()
+    results = []
+    for n in sizes:
+        closet = f"bench{n}"
+        t0 = time.perf_counter()
+        seeded, failures = seed_closet(store, closet, n, offset=n * 10_000)
+        row = {"items": seeded, "seed_s": round(time.perf_counter() - t0, 3), "seed_failures": len(failures)}
+        row["grid"] = bench_grid(source, closet, stub_url)
+        StubHandler.tag_requests.clear()
+        row["chat"] = bench_chat(source, closet, stub_url)
+        t0 = time.perf_counter()
+        tagged = wait_for_tags(store, closet)
+        row["tagging"] = {"complete": tagged, "wait_s": round(time.perf_counter() - t0, 3),
+                          "requests": len(StubHandler.tag_requests), "payload_bytes": sum(StubHandler.tag_requests)}
+        row["chat_tagged"] = bench_chat(source, closet, stub_url)
+        row["upload"] = bench_upload(source, closet, stub_url, offset=n * 10_000 + 5_000)
+        print(json.dumps(row, ensure_ascii=False), file=sys.stderr)
+        results.append(row)
+    srv.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py rerun / upload / chat benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--out", default=None, help="JSON 輸出檔 (預設印喺 stdout)")
+    parser.add_argument("--workdir", default=None, help="closet_data 放邊 (預設用臨時目錄)")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="closet-bench-")
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "results": run(args.sizes, workdir),
+    }
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(out)
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
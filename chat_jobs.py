@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 背景對話：model call 交畀背景 thread，script 唔使喺度等 ---
+# 每個 session 最多一個進行中嘅 job (再問就 cancel 舊嗰個)；全 process 同時最多 max_active 個 call，
+# 多咗就排隊，唔會佔住 Streamlit 嘅 script thread。對話框用 fragment 定時睇 job 進度。
+
+JOB_TTL = 10 * 60     # 秒：完成咗但冇人攞 (例如 session 走咗) 嘅 job 幾耐之後清走
+
+
+class ChatJob:
+    def __init__(self, question):
+        self.question = question
+        self.parts = []                   # 已收到嘅文字片段 (串流模式逐段加)
+        self.cancel = threading.Event()
+        self.state = "queued"             # queued / running / done / cancelled
+        self.fallback = False             # model 冇回覆：要用本地備用 (要 session_state，留返主 thread 做)
+        self.created = time.time()
+        self.future = None
+
+    def text(self):
+        return "".join(self.parts)
+
+    def finished(self):
+        # 取消咗即刻當完成，唔使等背景 thread 收尾
+        return self.state == "done" or self.cancel.is_set()
+
+    def waited(self):
+        return time.time() - self.created
+
+
+class ChatRunner:
+    def __init__(self, max_active=4):
+        self.max_active = max_active
+        self._executor = ThreadPoolExecutor(max_workers=max_active, thread_name_prefix="chat")
+        self._jobs = {}                   # session -> ChatJob
+        self._lock = threading.Lock()
+        self.stats_counters = {"submitted": 0, "completed": 0, "cancelled": 0, "fallbacks": 0}
+
+    def submit(self, session, question, work):
+        # work(job) -> yield 文字片段；要自己睇 job.cancel，亦唔可以掂 session_state
+        job = ChatJob(question)
+        with self._lock:
+            self._prune()
+            old = self._jobs.get(session)
+            self._jobs[session] = job
+            self.stats_counters["submitted"] += 1
+        if old: self._cancel(old)
+        job.future = self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job, work):
+        with self._lock:
+            if job.cancel.is_set(): return
+            job.state = "running"
+        try:
+            for delta in work(job):
+                if job.cancel.is_set(): break
+                job.parts.append(delta)
+        except Exception:
+            pass
+        with self._lock:
+            if job.cancel.is_set():
+                job.state = "cancelled"
+                return
+            job.fallback = not job.parts
+            job.state = "done"
+            self.stats_counters["completed"] += 1
+            if job.fallback: self.stats_counters["fallbacks"] += 1
+
+    def _cancel(self, job):
+        # 回傳有冇真係取消到 (已經答完就 False)
+        with self._lock:
+            if job.finished(): return False
+            job.cancel.set()
+            self.stats_counters["cancelled"] += 1
+            # 未開始 (排緊隊) 就直接標記；跑緊嘅由 _run 收尾
+            if job.state == "queued": job.state = "cancelled"
+        if job.future: job.future.cancel()
+        return True
+
+    def get(self, session):
+        with self._lock:
+            return self._jobs.get(session)
+
+    def cancel(self, session):
+        job = self.get(session)
+        return bool(job) and self._cancel(job)
+
+    def pop(self, session, job):
+        # 結果已經攞咗：只移走同一個 job (期間有新問題就保留新嗰個)
+        with self._lock:
+            if self._jobs.get(session) is job: del self._jobs[session]
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL
+        for session in [s for s, j in self._jobs.items() if j.finished() and j.created < cutoff]:
+            del self._jobs[session]
+
+    def stats(self):
+        with self._lock:
+            states = [j.state for j in self._jobs.values()]
+            return dict(self.stats_counters, max_active=self.max_active,
+                        running=states.count("running"), queued=states.count("queued"))
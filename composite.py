@@ -0,0 +1,69 @@
+from PIL import Image, ImageDraw
+
+from contact_sheet import encode_jpeg, label_font
+
+# --- 成套搭配合成圖：上衣 / 連身裙 疊喺下身上面，外套 / 鞋 / 配件 排喺右邊細欄 ---
+# 一套衫一張細圖：試身室 / 對話建議都用佢，亦可以一張圖送畀 model 代替逐件
+
+MAIN_WIDTH = 240
+SIDE_WIDTH = 120
+MAX_HEIGHT = 640
+MAX_BYTES = 120 * 1024
+LABEL_HEIGHT = 16
+GAP = 4
+
+MAIN_ORDER = ["上衣", "連身裙", "下身", "褲", "裙"]
+SIDE_ORDER = ["外套", "鞋", "配件"]
+
+
+def arrange(items):
+    # items: [{"sid", "sha", "category"}] -> (主欄, 側欄)，各自按固定次序排
+    def rank(order, item):
+        cat = item.get('category')
+        return order.index(cat) if cat in order else len(order)
+    main = sorted((x for x in items if x.get('category') in MAIN_ORDER), key=lambda x: rank(MAIN_ORDER, x))
+    side = sorted((x for x in items if x.get('category') not in MAIN_ORDER), key=lambda x: rank(SIDE_ORDER, x))
+    if not main: main, side = side[:1], side[1:]
+    return main, side
+
+
+def _column(entries, width):
+    # entries: [(label, open_image)] -> 一條直欄 (PIL Image)；每件頂部有 [ID: n] 標籤條
+    tiles = []
+    font = label_font(int(LABEL_HEIGHT * 0.8))
+    for label, open_image in entries:
+        img = open_image()
+        img.draft('RGB', (width, width * 2))
+        img = img.convert('RGB')
+        img.thumbnail((width, width * 2))
+        tile = Image.new('RGB', (width, img.height + LABEL_HEIGHT), (255, 255, 255))
+        tile.paste(img, ((width - img.width) // 2, LABEL_HEIGHT))
+        draw = ImageDraw.Draw(tile)
+        draw.rectangle([0, 0, width - 1, LABEL_HEIGHT - 1], fill=(0, 0, 0))
+        draw.text((4, 1), label, fill=(255, 255, 255), font=font)
+        tiles.append(tile)
+    height = sum(t.height for t in tiles) + GAP * max(0, len(tiles) - 1)
+    col = Image.new('RGB', (width, max(height, 1)), (255, 255, 255))
+    y = 0
+    for t in tiles:
+        col.paste(t, (0, y))
+        y += t.height + GAP
+    return col
+
+
+def render_outfit(main, side=(), max_height=MAX_HEIGHT, max_bytes=MAX_BYTES):
+    # main / side: [(label, open_image)]；回傳 JPEG bytes
+    if not main and not side: return b""
+    main_col = _column(main, MAIN_WIDTH) if main else None
+    side_col = _column(side, SIDE_WIDTH) if side else None
+    cols = [c for c in (main_col, side_col) if c is not None]
+    width = sum(c.width for c in cols) + GAP * (len(cols) - 1)
+    height = max(c.height for c in cols)
+    canvas = Image.new('RGB', (width, height), (255, 255, 255))
+    x = 0
+    for c in cols:
+        canvas.paste(c, (x, 0))
+        x += c.width + GAP
+    if canvas.height > max_height:
+        canvas.thumbnail((width, max_height))
+    return encode_jpeg(canvas, max_bytes)
@@ -0,0 +1,79 @@
+import io
+import math
+
+from PIL import Image, ImageDraw, ImageFont
+
+# --- Contact sheet：將多件單品砌成一張 (或幾張) 有 [ID: n] 標籤嘅拼圖 ---
+# 格仔大小按像素 / byte 預算揀，令 model 一次過睇到大部分衣櫃
+
+SHEET_MAX_PIXELS = 1536 * 1536   # 每張拼圖像素上限
+SHEET_MAX_BYTES = 350 * 1024     # 每張 JPEG 上限
+MAX_SHEETS = 2
+MIN_TILE = 96                    # 再細 model 就睇唔清
+MAX_TILE = 320
+LABEL_RATIO = 0.16               # 標籤條佔格仔高度
+
+
+def label_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def sheet_capacity(max_pixels=SHEET_MAX_PIXELS, max_sheets=MAX_SHEETS):
+    return max_sheets * int(max_pixels // (MIN_TILE * MIN_TILE))
+
+
+def plan_layout(n, max_pixels=SHEET_MAX_PIXELS, max_sheets=MAX_SHEETS):
+    # 回傳 (每張件數, 欄數, 格仔邊長)；盡量用最大嘅格仔
+    if n == 0: return 0, 0, 0
+    for sheets in range(1, max_sheets + 1):
+        per_sheet = math.ceil(n / sheets)
+        cols = math.ceil(math.sqrt(per_sheet))
+        rows = math.ceil(per_sheet / cols)
+        tile = min(MAX_TILE, int(math.sqrt(max_pixels / (cols * rows))))
+        if tile >= MIN_TILE or sheets == max_sheets:
+            return per_sheet, cols, max(tile, MIN_TILE)
+
+
+def _render(entries, cols, tile):
+    rows = math.ceil(len(entries) / cols)
+    sheet = Image.new('RGB', (cols * tile, rows * tile), (255, 255, 255))
+    draw = ImageDraw.Draw(sheet)
+    label_h = max(14, int(tile * LABEL_RATIO))
+    font = label_font(int(label_h * 0.8))
+    for i, (label, open_image) in enumerate(entries):
+        x, y = (i % cols) * tile, (i // cols) * tile
+        img = open_image()
+        img.draft('RGB', (tile, tile))
+        img = img.convert('RGB')
+        img.thumbnail((tile, tile - label_h))
+        sheet.paste(img, (x + (tile - img.width) // 2, y + label_h + (tile - label_h - img.height) // 2))
+        draw.rectangle([x, y, x + tile - 1, y + label_h], fill=(0, 0, 0))
+        draw.text((x + 4, y + 1), label, fill=(255, 255, 255), font=font)
+        draw.rectangle([x, y, x + tile - 1, y + tile - 1], outline=(200, 200, 200))
+    return sheet
+
+
+def encode_jpeg(sheet, max_bytes):
+    # 先降 quality，再唔夠就縮細
+    for quality in (80, 65, 50):
+        buffered = io.BytesIO()
+        sheet.save(buffered, format="JPEG", quality=quality)
+        if buffered.tell() <= max_bytes: return buffered.getvalue()
+    sheet = sheet.copy()
+    while True:
+        sheet.thumbnail((int(sheet.width * 0.8), int(sheet.height * 0.8)))
+        buffered = io.BytesIO()
+        sheet.save(buffered, format="JPEG", quality=50)
+        if buffered.tell() <= max_bytes or sheet.width < 256: return buffered.getvalue()
+
+
+def render_sheets(entries, max_pixels=SHEET_MAX_PIXELS, max_bytes=SHEET_MAX_BYTES, max_sheets=MAX_SHEETS):
+    # entries: [(label, open_image)]，open_image() 回傳 PIL Image (要用先讀)；超出容量嘅會被截走
+    entries = entries[:sheet_capacity(max_pixels, max_sheets)]
+    per_sheet, cols, tile = plan_layout(len(entries), max_pixels, max_sheets)
+    if not per_sheet: return []
+    return [encode_jpeg(_render(entries[i:i + per_sheet], cols, tile), max_bytes)
+            for i in range(0, len(entries), per_sheet)]
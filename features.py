@@ -0,0 +1,107 @@
+import numpy as np
+from PIL import Image
+
+# --- 單品視覺特徵 (上傳時計一次，存落 SQLite) ---
+# hist:     HSV 顏色直方圖 (8x3x3 = 72 bins, 已正規化)
+# dominant: 4 個主色 (RGB) + 佔比
+# phash:    64-bit 感知 hash (DCT)，用嚟搵相似 / 重複圖片
+
+HIST_BINS = (8, 3, 3)
+N_DOMINANT = 4
+_HIST_LEN = HIST_BINS[0] * HIST_BINS[1] * HIST_BINS[2]
+PACKED_SIZE = _HIST_LEN * 4 + N_DOMINANT * 3 + N_DOMINANT * 4 + 8
+
+# 顏色名 -> RGB 原型 (用嚟對應用戶講嘅顏色同埋喺 prompt 描述單品)
+COLOUR_NAMES = {
+    "黑": (20, 20, 20),
+    "白": (240, 240, 240),
+    "灰": (128, 128, 128),
+    "紅": (200, 30, 40),
+    "粉": (240, 160, 180),
+    "橙": (240, 130, 30),
+    "黃": (240, 210, 50),
+    "綠": (50, 140, 60),
+    "藍": (40, 80, 180),
+    "紫": (120, 60, 150),
+    "啡": (120, 80, 40),
+    "米": (225, 205, 170),
+}
+COLOUR_ALIASES = {
+    "black": "黑", "white": "白", "grey": "灰", "gray": "灰", "red": "紅", "pink": "粉",
+    "orange": "橙", "yellow": "黃", "green": "綠", "blue": "藍", "navy": "藍", "purple": "紫",
+    "brown": "啡", "beige": "米", "咖啡": "啡", "褐": "啡", "卡其": "米", "杏": "米",
+    "深藍": "藍", "牛仔": "藍", "红": "紅", "蓝": "藍", "绿": "綠", "黄": "黃",
+}
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0] *= 1 / np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(img):
+    gray = np.asarray(img.convert('L').resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    low = (_DCT32 @ gray @ _DCT32.T)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def compute(img):
+    small = img.convert('RGB')
+    small.thumbnail((64, 64))
+
+    hsv = np.asarray(small.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+    idx = ((hsv[:, 0] * HIST_BINS[0]) >> 8) * HIST_BINS[1] * HIST_BINS[2] \
+        + ((hsv[:, 1] * HIST_BINS[1]) >> 8) * HIST_BINS[2] \
+        + ((hsv[:, 2] * HIST_BINS[2]) >> 8)
+    hist = np.bincount(idx, minlength=_HIST_LEN).astype(np.float32)
+    hist /= max(hist.sum(), 1.0)
+
+    q = small.quantize(colors=N_DOMINANT, method=Image.Quantize.MEDIANCUT)
+    palette = np.asarray(q.getpalette()[:N_DOMINANT * 3], dtype=np.uint8).reshape(-1, 3)
+    counts = np.bincount(np.asarray(q).ravel(), minlength=N_DOMINANT)[:N_DOMINANT].astype(np.float32)
+    dominant = np.zeros((N_DOMINANT, 3), dtype=np.uint8)
+    dominant[:len(palette)] = palette
+    order = np.argsort(-counts)
+    weights = counts[order] / max(counts.sum(), 1.0)
+
+    return {"hist": hist, "dominant": dominant[order], "weights": weights.astype(np.float32), "phash": phash(img)}
+
+
+def pack(feat):
+    return (feat["hist"].astype('<f4').tobytes() + feat["dominant"].astype(np.uint8).tobytes()
+            + feat["weights"].astype('<f4').tobytes() + int(feat["phash"]).to_bytes(8, "big"))
+
+
+def unpack(blob):
+    o = 0
+    hist = np.frombuffer(blob, dtype='<f4', count=_HIST_LEN, offset=o); o += _HIST_LEN * 4
+    dominant = np.frombuffer(blob, dtype=np.uint8, count=N_DOMINANT * 3, offset=o).reshape(N_DOMINANT, 3); o += N_DOMINANT * 3
+    weights = np.frombuffer(blob, dtype='<f4', count=N_DOMINANT, offset=o); o += N_DOMINANT * 4
+    return {"hist": hist, "dominant": dominant, "weights": weights, "phash": int.from_bytes(blob[o:o + 8], "big")}
+
+
+def colour_name(rgb):
+    names = list(COLOUR_NAMES)
+    protos = np.asarray([COLOUR_NAMES[n] for n in names], dtype=np.float32)
+    d = ((protos - np.asarray(rgb, dtype=np.float32)) ** 2).sum(axis=1)
+    return names[int(d.argmin())]
+
+
+def describe(feat):
+    # prompt 用嘅簡短描述：最多兩個主色
+    names = []
+    for rgb, w in zip(feat["dominant"], feat["weights"]):
+        if w < 0.15: continue
+        n = colour_name(rgb)
+        if n not in names: names.append(n)
+    return "/".join(names[:2]) + "色" if names else ""
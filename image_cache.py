@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- 全 process 共用嘅圖片快取 (base64 字串)，有總記憶體上限 ---
+# key 由內容 hash 推導 (例如 "b64:<sha>:512")，唔同 session 用同一張圖只會存一份
+# 超出上限就踢最耐冇用嘅：可以由 disk 重建嘅 (縮圖 base64) 直接丟；
+# 砌出嚟嘅 (contact sheet) 先寫落 spill_dir，之後 miss 會由 disk 讀返
+# 每個 session 記住自己用過邊啲 key，用嚟報告 per-session / 全 process 用量
+
+SESSION_IDLE = 60 * 60     # 秒：咁耐冇出現嘅 session 唔再計
+
+
+class SharedImageCache:
+    def __init__(self, max_bytes, spill_dir=None, spill_max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._data = OrderedDict()     # key -> (value, spillable)
+        self._spilled = OrderedDict()  # 檔名 (_spill_name) -> size (disk 上)
+        self._sessions = {}            # session -> {"keys": set, "seen": time}
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "spill_hits": 0, "evictions": 0, "spills": 0}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            files = [os.path.join(spill_dir, n) for n in os.listdir(spill_dir) if n.endswith(".b64")]
+            for path in sorted(files, key=os.path.getmtime):
+                self._spilled[os.path.basename(path)[:-4]] = os.path.getsize(path)
+
+    @staticmethod
+    def _spill_name(key):
+        return key.replace(":", "_")
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, self._spill_name(key) + ".b64")
+
+    def _touch_session(self, session, key):
+        if session is None: return
+        entry = self._sessions.setdefault(session, {"keys": set(), "seen": 0})
+        entry["keys"].add(key)
+        entry["seen"] = time.time()
+
+    def get(self, key, session=None, load=None, spillable=False):
+        # load: miss 時由 disk 重建嘅 callable；冇就回傳 None
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                self.stats_counters["hits"] += 1
+                self._touch_session(session, key)
+                return hit[0]
+            spilled = self._spill_name(key) in self._spilled
+        if spilled:
+            try:
+                with open(self._spill_path(key), encoding="utf-8") as f:
+                    value = f.read()
+                with self._lock:
+                    self.stats_counters["spill_hits"] += 1
+                self.put(key, value, session, spillable=True)
+                return value
+            except OSError:
+                with self._lock:
+                    self._spilled.pop(self._spill_name(key), None)
+        with self._lock:
+            self.stats_counters["misses"] += 1
+        if load is None: return None
+        value = load()
+        self.put(key, value, session, spillable)
+        return value
+
+    def put(self, key, value, session=None, spillable=False):
+        to_spill = []
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= len(self._data.pop(key)[0])
+            self._data[key] = (value, spillable)
+            self.total_bytes += len(value)
+            self._touch_session(session, key)
+            while self.total_bytes > self.max_bytes and len(self._data) > 1:
+                old_key, (old, old_spillable) = self._data.popitem(last=False)
+                self.total_bytes -= len(old)
+                self.stats_counters["evictions"] += 1
+                if old_spillable and self.spill_dir and self._spill_name(old_key) not in self._spilled:
+                    to_spill.append((old_key, old))
+            self._prune_sessions()
+        for old_key, old in to_spill:
+            self._spill(old_key, old)
+
+    def _spill(self, key, value):
+        path = self._spill_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        drop = []
+        with self._lock:
+            self._spilled[self._spill_name(key)] = len(value)
+            self.stats_counters["spills"] += 1
+            while sum(self._spilled.values()) > self.spill_max_bytes and len(self._spilled) > 1:
+                drop.append(self._spilled.popitem(last=False)[0])
+        for name in drop:
+            try:
+                os.remove(os.path.join(self.spill_dir, name + ".b64"))
+            except OSError:
+                pass
+
+    def release(self, session, key=None):
+        # session 唔再用 (某張圖 / 全部)；內容照留喺快取，其他 session 可能仲用緊
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None: return
+            if key is None: self._sessions.pop(session)
+            else: entry["keys"].discard(key)
+
+    def _prune_sessions(self):
+        cutoff = time.time() - SESSION_IDLE
+        for session in [s for s, e in self._sessions.items() if e["seen"] < cutoff]:
+            del self._sessions[session]
+
+    def usage(self, session):
+        # 呢個 session 用緊、而且仲喺記憶體嘅 entries / bytes
+        with self._lock:
+            keys = self._sessions.get(session, {}).get("keys", ())
+            resident = [self._data[k][0] for k in keys if k in self._data]
+            return {"entries": len(resident), "bytes": sum(len(v) for v in resident)}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.stats_counters, entries=len(self._data), bytes=self.total_bytes,
+                        max_bytes=self.max_bytes, sessions=len(self._sessions),
+                        spilled_entries=len(self._spilled), spilled_bytes=sum(self._spilled.values()))
+
+    def __len__(self):
+        return len(self._data)
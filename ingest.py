@@ -0,0 +1,83 @@
+import io
+from concurrent.futures import as_completed
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import features
+from wardrobe_store import DISPLAY_SIZE, LLM_SIZE
+
+# --- 上傳流水線：thread pool 並行 decode / 轉正 / 縮圖 / hash，之後去重 ---
+
+STORE_MAX_SIZE = 1600      # 原圖最長邊 (手機相通常 4000px，冇必要全存)
+NEAR_DUP_DISTANCE = 6      # phash 漢明距離 <= 呢個 ...
+NEAR_DUP_COLOUR = 0.7      # ... 而且顏色直方圖重疊 >= 呢個，先當係同一件 (同款唔同色唔算重複)
+
+
+def _jpeg(img, size=None, quality=None):
+    if size:
+        img = img.copy()
+        img.thumbnail((size, size))
+    buffered = io.BytesIO()
+    if quality: img.save(buffered, format="JPEG", quality=quality)
+    else: img.save(buffered, format="JPEG")
+    return buffered.getvalue(), img
+
+
+def prepare(name, data, store):
+    # 喺 worker thread 跑：回傳 {"name", "sha", "feat", "phash", "hist"}，失敗就 raise
+    try:
+        img = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise ValueError("唔係支援嘅圖片格式")
+    img.draft('RGB', (STORE_MAX_SIZE, STORE_MAX_SIZE))
+    img = ImageOps.exif_transpose(img).convert('RGB')
+    if max(img.size) > STORE_MAX_SIZE:
+        img.thumbnail((STORE_MAX_SIZE, STORE_MAX_SIZE))
+
+    stored, _ = _jpeg(img, quality=90)
+    sha = store.put_blob(stored)
+    display, _ = _jpeg(img, DISPLAY_SIZE)
+    store.put_derived(sha, DISPLAY_SIZE, display)
+    llm, llm_img = _jpeg(img, LLM_SIZE)
+    store.put_derived(sha, LLM_SIZE, llm)
+
+    feat = features.compute(llm_img)
+    return {"name": name, "sha": sha, "feat": features.pack(feat), "phash": feat["phash"], "hist": feat["hist"]}
+
+
+def is_near_duplicate(res, feat):
+    if features.hamming(res["phash"], feat["phash"]) > NEAR_DUP_DISTANCE: return False
+    return float(np.minimum(res["hist"], feat["hist"]).sum()) >= NEAR_DUP_COLOUR
+
+
+def ingest(files, store, executor, known_shas=(), known_features=(), on_progress=None):
+    # files: [(name, bytes)]；known_features: 衣櫃現有單品嘅 features (features.unpack 格式)
+    # 回傳 (accepted, duplicates, failures)；accepted 保持上傳次序
+    futures = {executor.submit(prepare, name, data, store): i for i, (name, data) in enumerate(files)}
+    results = [None] * len(files)
+    failures = []
+    for done, fut in enumerate(as_completed(futures), 1):
+        i = futures[fut]
+        try:
+            results[i] = fut.result()
+        except Exception as e:
+            failures.append((files[i][0], str(e) or e.__class__.__name__))
+        if on_progress: on_progress(done, len(files))
+
+    seen_shas = set(known_shas)
+    seen_features = list(known_features)
+    accepted, duplicates = [], []
+    for res in results:
+        if res is None: continue
+        if res["sha"] in seen_shas:
+            duplicates.append((res["name"], "完全相同"))
+            continue
+        if any(is_near_duplicate(res, f) for f in seen_features):
+            duplicates.append((res["name"], "非常相似"))
+            store.discard_blob(res["sha"])
+            continue
+        seen_shas.add(res["sha"])
+        seen_features.append(res)
+        accepted.append(res)
+    return accepted, duplicates, failures
@@ -0,0 +1,262 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- OpenRouter Client (連線池 + Hedged fallback) ---
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+DEFAULT_MODELS = [
+    "google/gemini-2.0-flash-exp:free",
+    "google/gemini-1.5-flash:free",
+    "meta-llama/llama-3.2-11b-vision-instruct:free",
+]
+
+class IncompleteStream(Exception):
+    # SSE 未收到 [DONE] / finish_reason 就斷咗：已收到嘅只係半截回覆
+    pass
+
+
+CANCEL_POLL = 0.25    # 秒：等 model 回覆期間幾耐睇一次外部 cancel
+
+
+HEALTH_ALPHA = 0.3          # EWMA 權重：新結果佔幾多
+HEALTH_HALF_LIFE = 300.0    # 秒：冇新結果時錯誤率每隔咁耐減半，舊嘅失敗唔會永遠拖後
+
+
+class ModelStats:
+    # 每個 model 嘅延遲同錯誤率 (都係 EWMA)，用嚟調整 fallback 次序；successes / errors 只係累計數，畀 debug 睇
+    def __init__(self):
+        self.successes = 0
+        self.errors = 0
+        self.latency = None       # 完整回覆時間 (chat)；ordered_models 用呢個比較
+        self.ttft = None          # 串流 time-to-first-token，同 latency 唔可以比，分開記
+        self.failure = 0.0
+        self.updated = None
+
+    def record(self, ok, elapsed, now=None, first_token=False):
+        now = time.monotonic() if now is None else now
+        self.failure = (1 - HEALTH_ALPHA) * self.error_rate(now) + HEALTH_ALPHA * (0.0 if ok else 1.0)
+        self.updated = now
+        if ok:
+            self.successes += 1
+            if first_token:
+                self.ttft = elapsed if self.ttft is None else 0.7 * self.ttft + 0.3 * elapsed
+            else:
+                self.latency = elapsed if self.latency is None else 0.7 * self.latency + 0.3 * elapsed
+        else:
+            self.errors += 1
+
+    def error_rate(self, now=None):
+        if self.updated is None: return 0.0
+        now = time.monotonic() if now is None else now
+        return self.failure * 0.5 ** (max(0.0, now - self.updated) / HEALTH_HALF_LIFE)
+
+    def as_dict(self):
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "ttft": round(self.ttft, 3) if self.ttft is not None else None,
+        }
+
+
+class OpenRouterClient:
+    def __init__(self, api_key, url=OPENROUTER_URL, models=None, timeout=15,
+                 hedged=True, hedge_delay=2.0, max_workers=8):
+        self.api_key = api_key
+        self.url = url
+        self.models = list(models or DEFAULT_MODELS)
+        self.timeout = timeout
+        self.hedged = hedged
+        self.hedge_delay = hedge_delay
+
+        # 共用 Session：keep-alive + TLS 重用
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "HTTP-Referer": "https://localhost:8501",
+            "X-Title": "My Stylist App",
+            "Content-Type": "application/json",
+        })
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="openrouter")
+        self._lock = threading.Lock()
+        self.stats = {m: ModelStats() for m in self.models}
+
+    def ordered_models(self):
+        # 而家健康嘅排前：近期錯誤率低 > 延遲低；未有數據嘅保持原本次序
+        with self._lock:
+            now = time.monotonic()
+            def score(pair):
+                pos, model = pair
+                st_ = self.stats[model]
+                lat = st_.latency if st_.latency is not None else float(self.timeout)
+                return (round(st_.error_rate(now), 1), lat, pos)
+            return [m for _, m in sorted(enumerate(self.models), key=score)]
+
+    def stats_snapshot(self):
+        with self._lock:
+            return {m: s.as_dict() for m, s in self.stats.items()}
+
+    def _record(self, model, ok, elapsed, first_token=False):
+        with self._lock:
+            self.stats.setdefault(model, ModelStats()).record(ok, elapsed, first_token=first_token)
+
+    def _call(self, model, messages, cancel, temperature, metrics=None):
+        if cancel.is_set(): return None
+        payload = json.dumps({"model": model, "messages": messages, "temperature": temperature})
+        if metrics:
+            metrics.incr("llm.models_tried")
+            metrics.incr("llm.bytes_sent", len(payload))
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            # stream=True 令我哋可以喺其他 model 贏咗之後中途放棄下載
+            with self.session.post(self.url, data=payload, timeout=self.timeout, stream=True) as res:
+                if res.status_code != 200: return None
+                chunks = []
+                for chunk in res.iter_content(chunk_size=8192):
+                    if cancel.is_set(): return None
+                    chunks.append(chunk)
+                data = json.loads(b"".join(chunks))
+                if 'choices' in data and len(data['choices']) > 0:
+                    content = data['choices'][0]['message']['content']
+                    if content:
+                        ok = True
+                        return content
+            return None
+        except Exception:
+            return None
+        finally:
+            elapsed = time.perf_counter() - t0
+            if not cancel.is_set() or ok:
+                self._record(model, ok, elapsed)
+            if metrics:
+                metrics.record("llm.attempt", elapsed, start=t0, model=model, ok=ok)
+
+    def chat(self, content_parts, temperature=0.7, metrics=None, cancel=None):
+        # cancel: 外部 threading.Event (例如用戶閂咗對話框)；set 咗就盡快放棄，回傳 None
+        messages = [{"role": "user", "content": content_parts}]
+        models = self.ordered_models()
+        stop = threading.Event()
+
+        if not self.hedged:
+            for model in models:
+                if cancel is not None and cancel.is_set(): return None
+                content = self._call(model, messages, cancel or stop, temperature, metrics)
+                if content: return content
+            return None
+
+        # Hedged：第一個 model 未返嚟 (或者已經失敗) 就隔 hedge_delay 秒再射下一個，邊個先有答案就用邊個
+        remaining = list(models)
+        pending = set()
+        next_at = 0.0
+        try:
+            while remaining or pending:
+                if cancel is not None and cancel.is_set(): return None
+                now = time.monotonic()
+                if remaining and now >= next_at:
+                    pending.add(self._executor.submit(self._call, remaining.pop(0), messages, stop, temperature, metrics))
+                    next_at = now + self.hedge_delay
+                timeout = max(0.0, next_at - now) if remaining else None
+                if cancel is not None: timeout = CANCEL_POLL if timeout is None else min(timeout, CANCEL_POLL)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    content = fut.result()
+                    if content: return content
+                # 有 model 失敗咗就唔使等，即刻試下一個
+                if done: next_at = 0.0
+            return None
+        finally:
+            stop.set()
+            for fut in pending: fut.cancel()
+
+    def _pump(self, payload, out, stop):
+        # 背景 thread：POST + 逐行讀 SSE，結果放入 out：("delta", 文字) / ("end", None) / ("error", exception)
+        # 讀 header / 等第一個 byte / keep-alive 都喺呢度 block，stream_chat 嗰邊可以照睇 cancel
+        try:
+            with self.session.post(self.url, data=payload, timeout=self.timeout, stream=True) as res:
+                if res.status_code != 200: raise IOError(f"HTTP {res.status_code}")
+                for delta in iter_sse_deltas(res, stop):
+                    out.put(("delta", delta))
+            out.put(("end", None))
+        except Exception as e:
+            out.put(("error", e))
+
+    def stream_chat(self, content_parts, temperature=0.7, metrics=None, cancel=None):
+        # SSE 串流：逐個 model 試，直到有一個開始吐 token；之後就一路 yield 落去
+        # 正常 return = 完整回覆 (或者 cancel 咗)；開始咗之後斷線會 raise (例如 IncompleteStream)
+        messages = [{"role": "user", "content": content_parts}]
+        for model in self.ordered_models():
+            if cancel is not None and cancel.is_set(): return
+            payload = json.dumps({"model": model, "messages": messages, "temperature": temperature, "stream": True})
+            if metrics:
+                metrics.incr("llm.models_tried")
+                metrics.incr("llm.bytes_sent", len(payload))
+            t0 = time.perf_counter()
+            started = False
+            out, stop = queue.Queue(), threading.Event()
+            self._executor.submit(self._pump, payload, out, stop)
+            try:
+                while True:
+                    # 每 CANCEL_POLL 秒睇一次 cancel；取消咗 stop 會令 _pump 喺下一行 (包括 keep-alive) 收手閂線
+                    if cancel is not None and cancel.is_set(): return
+                    try:
+                        kind, value = out.get(timeout=CANCEL_POLL)
+                    except queue.Empty:
+                        continue
+                    if kind == "end": break
+                    if kind == "error": raise value
+                    if not started:
+                        # 記錄 time-to-first-token
+                        ttft = time.perf_counter() - t0
+                        self._record(model, True, ttft, first_token=True)
+                        if metrics: metrics.record("llm.first_token", ttft, start=t0, model=model)
+                        started = True
+                    yield value
+            except Exception:
+                # 開始咗先斷：唔可以當完整回覆 (caller 唔好入快取)，交返畀 caller 處理
+                if started:
+                    if metrics: metrics.record("llm.attempt", time.perf_counter() - t0, start=t0, model=model, ok=False)
+                    raise
+            finally:
+                stop.set()
+            if started:
+                if metrics: metrics.record("llm.attempt", time.perf_counter() - t0, start=t0, model=model, ok=True)
+                return
+            self._record(model, False, time.perf_counter() - t0)
+            if metrics: metrics.record("llm.attempt", time.perf_counter() - t0, start=t0, model=model, ok=False)
+
+
+def iter_sse_deltas(response, stop=None):
+    # OpenRouter 嘅 SSE：`data: {...}` 一行一個 chunk，`: ...` 係 keep-alive 註解，`data: [DONE]` 完結
+    # 冇 [DONE] 又冇 finish_reason 就完咗 (連線中途斷) -> IncompleteStream
+    finished = False
+    for line in response.iter_lines(chunk_size=None):
+        # 每一行 (包括 keep-alive 註解) 都睇下使唔使收手
+        if stop is not None and stop.is_set(): return
+        if not line or line.startswith(b":"): continue
+        if not line.startswith(b"data:"): continue
+        data = line[5:].strip()
+        if data == b"[DONE]": return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        choices = chunk.get('choices') or []
+        if not choices: continue
+        delta = (choices[0].get('delta') or {}).get('content')
+        if delta: yield delta
+        if choices[0].get('finish_reason'): finished = True
+    if not finished:
+        raise IncompleteStream("stream ended before [DONE]")
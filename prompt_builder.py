@@ -0,0 +1,81 @@
+import re
+
+# --- Prompt 組裝：有 token 上限；衣櫃摘要 + 壓縮咗嘅之前對話 ---
+# 唔裝 tokenizer：中日韓字大約一字一 token，其他大約 4 個字元一 token，寧願估多啲
+# 優先次序：開場 / 問題 / 規則 / 附圖單品 一定有 -> 之前對話 -> 其餘衣櫃清單 (放唔落就截)
+
+PROMPT_TOKEN_BUDGET = 2500
+HISTORY_TOKEN_BUDGET = 400
+QUESTION_CHARS = 500
+RECENT_TURNS = 2          # 最近幾輪 (一問一答) 保留原文 (截短)
+RECENT_CHARS = 240
+OLDER_CHARS = 40          # 再舊嘅只留開頭 / 建議咗邊幾件
+
+_CJK = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def clip(text, n):
+    text = " ".join((text or "").split())
+    return text if len(text) <= n else text[:n - 1] + "…"
+
+
+def item_line(item, desc):
+    return f"[ID: {item['sid']}] {item['category']} {item.get('season', '四季')} {desc}"
+
+
+def compact_history(history, budget=HISTORY_TOKEN_BUDGET):
+    # history: chat_history 格式 [{"role", "content", "related_ids"?}]；由新到舊揀，超出 budget 就停
+    lines, used = [], 0
+    for n, msg in enumerate(reversed(history)):
+        who = "用戶" if msg["role"] == "user" else "你"
+        if n < RECENT_TURNS * 2:
+            text = clip(msg["content"], RECENT_CHARS)
+        elif msg.get("related_ids"):
+            text = "建議咗 " + "、".join(f"[ID: {i}]" for i in msg["related_ids"])
+        else:
+            text = clip(msg["content"], OLDER_CHARS)
+        line = f"{who}：{text}"
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget: break
+        used += cost
+        lines.append(line)
+    return lines[::-1]
+
+
+def build_prompt(header, question, rules, list_title, attached, catalogue, history=(),
+                 budget=PROMPT_TOKEN_BUDGET):
+    # attached: 附圖單品 (一定要列)；catalogue: 其餘單品，按次序放到 budget 用完為止
+    # 回傳 (prompt, {"tokens", "listed", "omitted", "history"})
+    question_line = f"用戶問：{clip(question, QUESTION_CHARS)}"
+    fixed = [header, question_line, rules, list_title] + [f"- {x}" for x in attached]
+    used = sum(estimate_tokens(x) + 1 for x in fixed)
+
+    history_lines = []
+    for line in history:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget: break
+        used += cost
+        history_lines.append(line)
+    if history_lines:
+        used += estimate_tokens("之前對話：") + 1
+
+    listed = []
+    for line in catalogue:
+        cost = estimate_tokens(line) + 3
+        if used + cost > budget: break
+        used += cost
+        listed.append(f"- {line}")
+    omitted = len(catalogue) - len(listed)
+
+    parts = [header]
+    if history_lines: parts += ["之前對話："] + history_lines
+    parts += [question_line, rules, list_title] + [f"- {x}" for x in attached] + listed
+    if omitted: parts.append(f"(仲有 {omitted} 件未列出)")
+    prompt = "\n".join(parts)
+    return prompt, {"tokens": estimate_tokens(prompt), "listed": len(attached) + len(listed),
+                    "omitted": omitted, "history": len(history_lines)}
@@ -0,0 +1,126 @@
+import numpy as np
+
+from retrieval import season_for_temperature
+
+# --- 本地配搭推薦 (AI 連唔到 / 快速模式用) ---
+# 將所有 上衣 x 下身 (加可選外套、鞋) 組合一次過用 NumPy 打分：
+# 顏色協調 + 季節 / 氣溫，取最高分嘅幾套；同樣輸入一定得到同樣結果
+
+TOP_CATS = ["上衣"]
+BOTTOM_CATS = ["下身", "褲", "裙"]
+DRESS_CATS = ["連身裙"]
+OUTER_CATS = ["外套"]
+SHOE_CATS = ["鞋"]
+
+OUTER_BELOW = 20.0     # 氣溫 (°C) 低過呢個先考慮外套
+OUTER_POOL = 16        # 外套先按季節 + 平均協調揀頭幾件，避免 (上衣 x 下身 x 外套) 爆大
+
+
+def main_colour_hsv(feats):
+    # 每件單品最大佔比主色 -> (h 0-360, s 0-1, v 0-1)
+    if not feats: return np.zeros((0, 3), dtype=np.float32)
+    rgb = np.stack([f["dominant"][int(np.argmax(f["weights"]))] for f in feats]).astype(np.float32) / 255.0
+    mx, mn = rgb.max(axis=1), rgb.min(axis=1)
+    delta = mx - mn
+    safe = np.where(delta == 0, 1.0, delta)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    h = np.where(mx == r, ((g - b) / safe) % 6, np.where(mx == g, (b - r) / safe + 2, (r - g) / safe + 4)) * 60.0
+    h = np.where(delta == 0, 0.0, h)
+    s = np.where(mx == 0, 0.0, delta / np.where(mx == 0, 1.0, mx))
+    return np.stack([h, s, mx], axis=1)
+
+
+def harmony(a, b):
+    # a: (n, 3) HSV, b: (m, 3) HSV -> (n, m) 協調分
+    neutral_a = (a[:, 1] < 0.2) | (a[:, 2] < 0.2) | ((a[:, 2] > 0.9) & (a[:, 1] < 0.15))
+    neutral_b = (b[:, 1] < 0.2) | (b[:, 2] < 0.2) | ((b[:, 2] > 0.9) & (b[:, 1] < 0.15))
+    diff = np.abs(a[:, None, 0] - b[None, :, 0])
+    diff = np.minimum(diff, 360.0 - diff)
+    score = np.where(diff < 30, 0.6, np.where(diff > 150, 0.4, np.where((diff > 60) & (diff < 120), -0.5, 0.0)))
+    either_neutral = neutral_a[:, None] | neutral_b[None, :]
+    score = np.where(either_neutral, 1.0, score)
+    # 兩件都係中性色 (全黑全白) 略為單調
+    score = np.where(neutral_a[:, None] & neutral_b[None, :], 0.7, score)
+    return score.astype(np.float32)
+
+
+def season_score(items, temp):
+    target = season_for_temperature(temp)
+    if target is None: return np.zeros(len(items), dtype=np.float32)
+    seasons = np.asarray([it.get('season', '四季') for it in items])
+    return np.where(seasons == target, 1.0, np.where(seasons == "四季", 0.5, -1.0)).astype(np.float32)
+
+
+def _pick(items, feats, cats):
+    idx = [i for i, it in enumerate(items) if it.get('category') in cats]
+    return [items[i] for i in idx], [feats[i] for i in idx]
+
+
+def recommend(items, feats, temp=None, n=3):
+    # 回傳 [{"ids": [sid, ...], "score": float}]，最多 n 套，每件上衣 / 下身 / 連身裙最多用一次
+    tops, top_f = _pick(items, feats, TOP_CATS)
+    bottoms, bottom_f = _pick(items, feats, BOTTOM_CATS)
+    dresses, dress_f = _pick(items, feats, DRESS_CATS)
+    outers, outer_f = _pick(items, feats, OUTER_CATS)
+    shoes, shoe_f = _pick(items, feats, SHOE_CATS)
+
+    top_c, bottom_c, dress_c = main_colour_hsv(top_f), main_colour_hsv(bottom_f), main_colour_hsv(dress_f)
+    outer_c, shoe_c = main_colour_hsv(outer_f), main_colour_hsv(shoe_f)
+
+    # (分數矩陣 (U, L), 上半身, 上半身顏色, 下身 或 None)
+    bases = []
+    # 上衣 x 下身
+    if tops and bottoms:
+        pair = harmony(top_c, bottom_c) + season_score(tops, temp)[:, None] + season_score(bottoms, temp)[None, :]
+        bases.append((pair, tops, top_c, bottoms))
+    # 連身裙自己一套 (當成冇下身)
+    if dresses:
+        bases.append(((season_score(dresses, temp) + 0.8)[:, None], dresses, dress_c, None))
+
+    if not bases: return []
+
+    want_outer = outers and temp is not None and temp < OUTER_BELOW
+    if want_outer and len(outers) > OUTER_POOL:
+        ref_c = np.concatenate([c for c in (top_c, bottom_c, dress_c) if len(c)])
+        pre = harmony(ref_c, outer_c).mean(axis=0) + season_score(outers, temp)
+        keep = np.sort(np.argsort(-pre, kind='stable')[:OUTER_POOL])
+        outers, outer_c = [outers[i] for i in keep], outer_c[keep]
+    candidates = []
+    for base, uppers, upper_c, lowers in bases:
+        total = base.copy()
+
+        # 鞋：淨係睇同下身 (或連身裙) 夾唔夾，可以分開計再 broadcast
+        best_shoe = None
+        if shoes:
+            ref_c = bottom_c if lowers is not None else upper_c
+            shoe_m = harmony(ref_c, shoe_c) + season_score(shoes, temp)[None, :]   # (L, S)
+            best_shoe = shoe_m.argmax(axis=1)
+            shoe_gain = 0.5 * shoe_m.max(axis=1)
+            total = total + (shoe_gain[None, :] if lowers is not None else shoe_gain[:, None])
+
+        # 外套：同上身 + 下身都要夾 -> (U, L, O)
+        best_outer = None
+        if want_outer:
+            om = harmony(upper_c, outer_c)[:, None, :] + season_score(outers, temp)[None, None, :]
+            if lowers is not None: om = om + harmony(bottom_c, outer_c)[None, :, :]
+            best_outer = om.argmax(axis=2)
+            total = total + 0.5 * om.max(axis=2)
+
+        # 由高分到低分揀，同一件上衣 / 下身唔重複用
+        used_u, used_l = set(), set()
+        found = 0
+        for f in np.argsort(-total, axis=None, kind='stable'):
+            u, l = np.unravel_index(f, total.shape)
+            if u in used_u or (lowers is not None and l in used_l): continue
+            used_u.add(u)
+            used_l.add(l)
+            ids = [uppers[u]['sid']]
+            if lowers is not None: ids.append(lowers[l]['sid'])
+            if best_outer is not None: ids.append(outers[best_outer[u, l]]['sid'])
+            if best_shoe is not None: ids.append(shoes[best_shoe[l if lowers is not None else u]]['sid'])
+            candidates.append({"ids": ids, "score": float(total[u, l])})
+            found += 1
+            if found >= n: break
+
+    candidates.sort(key=lambda c: (-c["score"], c["ids"]))
+    return candidates[:n]
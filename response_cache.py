@@ -0,0 +1,119 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --- AI 回覆快取：同一條問題 + 同一個 persona + 同一批圖 -> 直接用返上次答案 ---
+# 記憶體 LRU 喺前，SQLite 喺後 (重開 app 都仲喺度)；過咗 TTL 當冇
+# key = sha256(正規化 prompt, persona, 附圖內容 hash)；只係 model 真正回覆先會入快取
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+MEMORY_ENTRIES = 100
+
+_PUNCT = re.compile(r"[?？!！。．.,，、~～…]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    reply TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+
+
+def normalise(text):
+    # 全形半形 / 大細楷 / 空白 / 句尾標點 唔同都當係同一條問題
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(_PUNCT.sub(" ", text).split())
+
+
+def make_key(prompt, persona, image_hashes=()):
+    h = hashlib.sha256()
+    for part in [normalise(prompt), normalise(persona)] + list(image_hashes):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._mem = OrderedDict()    # key -> (reply, created)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def get(self, key, now=None):
+        now = now or time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT reply, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row: entry = (row[0], row[1])
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None: self._drop(key)
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, reply, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._remember(key, (reply, now))
+            if self._db is None: return
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, reply, created, used) VALUES (?, ?, ?, ?)",
+                                 (key, reply, now, now))
+                # 過期嘅同超出上限 (最耐冇用) 嘅一齊清
+                self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self._db.execute("DELETE FROM responses WHERE key NOT IN "
+                                 "(SELECT key FROM responses ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+
+    def _remember(self, key, entry):
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        # 有 SQLite 就記憶體只留熱門幾條；冇就成個快取都喺記憶體
+        limit = min(MEMORY_ENTRIES, self.max_entries) if self._db is not None else self.max_entries
+        while len(self._mem) > limit:
+            self._mem.popitem(last=False)
+
+    def _drop(self, key):
+        self._mem.pop(key, None)
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            stored = len(self._mem)
+            if self._db is not None:
+                stored = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": stored,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0}
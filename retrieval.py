@@ -0,0 +1,107 @@
+import re
+
+import numpy as np
+
+from features import COLOUR_NAMES, COLOUR_ALIASES
+
+# --- 本地檢索：每輪對話揀最相關嘅單品圖送畀 model ---
+# 分數 = 用戶提到嘅分類/顏色 + 季節/氣溫；再按分類平衡 (同一分類揀得越多，下一件越扣分)
+
+CATEGORY_KEYWORDS = {
+    "上衣": ["上衣", "衫", "恤", "top", "shirt", "tee", "blouse"],
+    "下身": ["下身", "褲", "裙", "bottom", "pants", "jeans", "skirt", "shorts"],
+    "連身裙": ["連身裙", "連衣裙", "dress"],
+    "外套": ["外套", "褸", "jacket", "coat", "冷衫"],
+    "鞋": ["鞋", "靴", "shoe", "sneaker", "boot"],
+    "配件": ["配件", "袋", "帽", "頸巾", "頸鏈", "bag", "hat", "accessor"],
+}
+
+# 用戶明確要睇相 / 評外觀先附圖；其他情況用文字標籤就夠
+IMAGE_KEYWORDS = ["張相", "睇相", "圖片", "附圖", "個樣", "好唔好睇", "襯唔襯"]
+IMAGE_WORDS = ["photo", "picture", "look"]    # 英文要成個字先算 ("looking for" / "lookbook" 唔算)
+_IMAGE_WORDS_RE = re.compile(r"\b(?:" + "|".join(IMAGE_WORDS) + r")s?\b")
+
+MAX_CHAT_IMAGES = 5
+IMAGE_BYTE_BUDGET = 400 * 1024   # base64 字數上限 (約 300KB JPEG)
+MIN_IMAGE_BYTES = 8 * 1024       # 預算淨返少過呢個就唔會再放得落任何一張圖
+MAX_SKIPS = 2 * MAX_CHAT_IMAGES  # 超出預算跳過咁多件就收手 (size_of 可能要 encode 張圖，唔好逐件試晒成個衣櫃)
+BALANCE_PENALTY = 1.0
+
+
+def season_for_temperature(temp):
+    if temp is None: return None
+    if temp >= 22: return "春夏"
+    if temp <= 16: return "秋冬"
+    return None
+
+
+def query_categories(query):
+    q = (query or "").lower()
+    return {cat for cat, words in CATEGORY_KEYWORDS.items() if any(w in q for w in words)}
+
+
+def query_wants_images(query):
+    q = (query or "").lower()
+    return any(w in q for w in IMAGE_KEYWORDS) or bool(_IMAGE_WORDS_RE.search(q))
+
+
+def query_colours(query):
+    q = (query or "").lower()
+    names = {n for n in COLOUR_NAMES if n in q}
+    names |= {n for alias, n in COLOUR_ALIASES.items() if alias in q}
+    return sorted(names)
+
+
+def score_items(items, feats, query="", season_hint=None):
+    n = len(items)
+    scores = np.zeros(n, dtype=np.float32)
+    if n == 0: return scores
+
+    # 分類
+    wanted = query_categories(query)
+    if wanted:
+        cats = np.asarray([it.get('category') in wanted for it in items])
+        scores += 2.0 * cats
+
+    # 顏色：用戶提到嘅顏色同單品主色嘅相似度 (按主色佔比加權)
+    colours = query_colours(query)
+    if colours:
+        dom = np.stack([f["dominant"] for f in feats]).astype(np.float32)         # (n, k, 3)
+        w = np.stack([f["weights"] for f in feats])                             # (n, k)
+        protos = np.asarray([COLOUR_NAMES[c] for c in colours], dtype=np.float32)  # (c, 3)
+        dist = np.sqrt(((dom[:, :, None, :] - protos[None, None]) ** 2).sum(-1))  # (n, k, c)
+        sim = np.clip(1.0 - dist / 200.0, 0.0, 1.0)
+        scores += 2.0 * (sim.max(axis=2) * w).sum(axis=1)
+
+    # 季節 / 氣溫
+    if season_hint:
+        seasons = np.asarray([it.get('season', '四季') for it in items])
+        scores += np.where(seasons == season_hint, 1.0, np.where(seasons == "四季", 0.5, -1.0))
+
+    return scores
+
+
+def select_items(items, feats, query="", season_hint=None, k=MAX_CHAT_IMAGES,
+                 byte_budget=IMAGE_BYTE_BUDGET, size_of=None):
+    # 貪婪揀 top-k：每揀一件，同分類剩低嘅分數扣 BALANCE_PENALTY；超出 byte 預算就跳過
+    # 預算就快用完、或者跳過太多件就停，size_of 最多 call k + MAX_SKIPS 次
+    scores = score_items(items, feats, query, season_hint)
+    # 同分時揀較新加入嘅單品
+    order = np.lexsort((-np.arange(len(items)), -scores))
+    remaining = list(order)
+    picked, used = [], 0
+    cat_count = {}
+    skips = 0
+    while remaining and len(picked) < k:
+        if size_of and (byte_budget - used < MIN_IMAGE_BYTES or skips >= MAX_SKIPS): break
+        best = max(remaining, key=lambda i: scores[i] - BALANCE_PENALTY * cat_count.get(items[i].get('category'), 0))
+        remaining.remove(best)
+        size = size_of(items[best]) if size_of else 0
+        if used + size > byte_budget:
+            skips += 1
+            continue
+        used += size
+        picked.append(items[best])
+        cat = items[best].get('category')
+        cat_count[cat] = cat_count.get(cat, 0) + 1
+    return picked
@@ -0,0 +1,119 @@
+import json
+import re
+import threading
+import time
+
+# --- 上傳後自動標籤：顏色 / 物料 / 正式程度 / 圖案 / 保暖度 ---
+# 一次過送幾張圖畀 vision model (一個 request 標幾件)，結果按 sha 存入 store；
+# 之後對話只需要送文字清單，唔使每輪都附圖。喺背景 thread 跑，唔會阻住上傳。
+
+BATCH_SIZE = 6            # 每個 request 標幾多件
+RETRY_AFTER = 10 * 60     # 標籤失敗嘅圖隔幾耐先再試 (秒)
+FORMALITY = ["休閒", "半正式", "正式", "運動"]
+PATTERNS = ["純色", "條紋", "格仔", "印花", "其他"]
+FIELD_CHARS = 8
+
+TAG_PROMPT = (
+    "你係衣物標籤助手。以下有 {n} 張衣物相，請按次序 (圖1 至 圖{n}) 為每件輸出一個 JSON object，欄位：\n"
+    "colour (主色，中文)、material (物料，中文，例如 棉 / 牛仔 / 羊毛 / 雪紡)、"
+    "formality (" + " / ".join(FORMALITY) + " 其中一個)、"
+    "pattern (" + " / ".join(PATTERNS) + " 其中一個)、warmth (1-5，1 最薄 5 最保暖)。\n"
+    "只輸出一個有 {n} 個 object 嘅 JSON array，唔好有其他文字。"
+)
+
+
+def clean_tags(tag):
+    if not isinstance(tag, dict): return None
+    out = {}
+    for key in ("colour", "material"):
+        value = str(tag.get(key) or "").strip()
+        if value: out[key] = value[:FIELD_CHARS]
+    if tag.get("formality") in FORMALITY: out["formality"] = tag["formality"]
+    if tag.get("pattern") in PATTERNS: out["pattern"] = tag["pattern"]
+    try:
+        warmth = int(tag.get("warmth"))
+        if 1 <= warmth <= 5: out["warmth"] = warmth
+    except (TypeError, ValueError):
+        pass
+    return out or None
+
+
+def parse_tags(text, n):
+    # model 回覆 -> n 個 dict (有啲可能係 None)；數量唔啱 / 唔係 JSON 就當成個 batch 失敗
+    if not text: return None
+    match = re.search(r"\[.*\]", text, re.S)
+    if not match: return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, list) or len(data) != n: return None
+    return [clean_tags(x) for x in data]
+
+
+def describe(tags):
+    # 一行緊湊描述，放入 prompt 清單
+    parts = [tags.get("colour"), tags.get("material"), tags.get("formality"), tags.get("pattern")]
+    if tags.get("warmth"): parts.append(f"保暖{tags['warmth']}")
+    return " ".join(p for p in parts if p)
+
+
+def content_parts(b64_list):
+    parts = [{"type": "text", "text": TAG_PROMPT.format(n=len(b64_list))}]
+    for n, b64 in enumerate(b64_list, 1):
+        parts.append({"type": "text", "text": f"圖{n}"})
+        parts.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}})
+    return parts
+
+
+class Tagger:
+    # 全 process 一個：記住邊啲 sha 排緊隊 / 啱啱失敗，避免重複送
+    def __init__(self, store, client, executor, batch_size=BATCH_SIZE):
+        self.store = store
+        self.client = client
+        self.executor = executor
+        self.batch_size = batch_size
+        self.version = 0          # 每次有新標籤 +1，畀 prompt 摘要判斷要唔要重建
+        self._pending = set()
+        self._failed = {}         # sha -> 失敗時間
+        self._lock = threading.Lock()
+
+    def schedule(self, shas, load_b64):
+        # load_b64(sha) -> 512px JPEG base64；回傳今次排咗幾多件
+        now = time.time()
+        with self._lock:
+            todo = [sha for sha in dict.fromkeys(shas)
+                    if sha not in self._pending and now - self._failed.get(sha, 0) > RETRY_AFTER]
+        if todo:
+            done = self.store.get_tags(todo)
+            todo = [sha for sha in todo if sha not in done]
+        with self._lock:
+            todo = [sha for sha in todo if sha not in self._pending]
+            self._pending.update(todo)
+        for i in range(0, len(todo), self.batch_size):
+            self.executor.submit(self._run, todo[i:i + self.batch_size], load_b64)
+        return len(todo)
+
+    def _run(self, batch, load_b64):
+        tags = None
+        try:
+            text = self.client.chat(content_parts([load_b64(sha) for sha in batch]), temperature=0)
+            tags = parse_tags(text, len(batch))
+        except Exception:
+            tags = None
+        tags = tags or [None] * len(batch)
+        stored = 0
+        for sha, tag in zip(batch, tags):
+            if tag:
+                self.store.put_tags(sha, tag)
+                stored += 1
+        # 寫入 store 之後先移出 pending，期間再 schedule 都唔會重複送
+        with self._lock:
+            for sha, tag in zip(batch, tags):
+                if not tag: self._failed[sha] = time.time()
+            self._pending.difference_update(batch)
+            if stored: self.version += 1
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
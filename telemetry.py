@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# --- 輕量計時 / 計數 (每次 script run 一個 RunMetrics) ---
+# 關閉時 span() 回傳共用嘅 nullcontext、incr() 直接 return，幾乎冇額外開銷
+
+_NULL = nullcontext()
+PROM_LABELS = ("model", "ok")   # 匯出 Prometheus 時保留嘅 span label；其他 (例如件數) 只留喺 JSONL
+
+
+class RunMetrics:
+    def __init__(self, enabled=False, run_id=None, scope="app"):
+        self.enabled = enabled
+        self.run_id = run_id
+        self.scope = scope    # "app" = 成個 script rerun；"fragment" = 局部 rerun
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []       # [{"name", "start", "seconds", **labels}]
+        self.counters = {}
+        self._lock = threading.Lock()   # hedged model call 喺其他 thread 記錄
+
+    def span(self, name, **labels):
+        if not self.enabled: return _NULL
+        return self._span(name, labels)
+
+    @contextmanager
+    def _span(self, name, labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0, start=t0, **labels)
+
+    def record(self, name, seconds, start=None, **labels):
+        if not self.enabled: return
+        entry = {"name": name, "start": round((start or time.perf_counter() - seconds) - self._t0, 6),
+                 "seconds": round(seconds, 6)}
+        entry.update(labels)
+        with self._lock:
+            self.spans.append(entry)
+
+    def incr(self, name, n=1):
+        if not self.enabled: return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def summary(self):
+        # 同名 span 合併：{"name": {"count", "seconds"}}
+        out = {}
+        with self._lock:
+            for s in self.spans:
+                agg = out.setdefault(s["name"], {"count": 0, "seconds": 0.0})
+                agg["count"] += 1
+                agg["seconds"] += s["seconds"]
+        return out
+
+    def to_dict(self):
+        with self._lock:
+            return {"run_id": self.run_id, "scope": self.scope, "started": self.started, "seconds": round(self.elapsed(), 6),
+                    "spans": list(self.spans), "counters": dict(self.counters)}
+
+
+def to_jsonl(runs):
+    return "".join(json.dumps(r.to_dict(), ensure_ascii=False) + "\n" for r in runs)
+
+
+def _prom_name(name):
+    return "closet_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _prom_labels(labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(labels.items())) + "}"
+
+
+def to_prometheus(runs):
+    # counter 加總；span 出 _seconds_sum / _seconds_count (按 label 分開)
+    counters, spans = {}, {}
+    for r in runs:
+        d = r.to_dict()
+        for k, v in d["counters"].items():
+            counters[k] = counters.get(k, 0) + v
+        for s in d["spans"]:
+            # 只留有限值嘅 label，唔係每個唔同數值都會變一條新 series
+            labels = {k: v for k, v in s.items() if k in PROM_LABELS}
+            key = (s["name"], tuple(sorted(labels.items())))
+            agg = spans.setdefault(key, [0, 0.0])
+            agg[0] += 1
+            agg[1] += s["seconds"]
+    lines = []
+    for k in sorted(counters):
+        name = _prom_name(k) + "_total"
+        lines += [f"# TYPE {name} counter", f"{name} {counters[k]}"]
+    seen = set()
+    for (name, labels), (count, total) in sorted(spans.items(), key=lambda kv: (kv[0][0], kv[0][1])):
+        base = _prom_name(name) + "_seconds"
+        if base not in seen:
+            lines.append(f"# TYPE {base} summary")
+            seen.add(base)
+        lab = _prom_labels(dict(labels))
+        lines.append(f"{base}_sum{lab} {total:.6f}")
+        lines.append(f"{base}_count{lab} {count}")
+    lines += ["# TYPE closet_runs_total counter", f"closet_runs_total {len(runs)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import uuid
+import zipfile
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive  # noqa: E402
+import features  # noqa: E402
+from wardrobe_store import DISPLAY_SIZE, LLM_SIZE, WardrobeStore  # noqa: E402
+
+CATEGORIES = ["上衣", "下身", "連身裙", "外套", "鞋", "配件"]
+SEASONS = ["四季", "春夏", "秋冬"]
+TAGS = {"colour": "黑色", "material": "棉", "formality": "休閒", "pattern": "純色", "warmth": 2}
+
+
+def jpeg(seed, size=(120, 160)):
+    buffered = io.BytesIO()
+    Image.new("RGB", size, (seed * 37 % 256, seed * 91 % 256, seed * 53 % 256)).save(buffered, "JPEG")
+    return buffered.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return WardrobeStore(str(tmp_path / "closet_data"))
+
+
+def seed(store, closet, n):
+    items = []
+    for i in range(n):
+        data = jpeg(i)
+        sha = store.put_blob(data)
+        img = Image.open(io.BytesIO(data))
+        for size in (DISPLAY_SIZE, LLM_SIZE):
+            store.derived_path(sha, size)
+        item = {'id': str(uuid.uuid4()), 'sha': sha, 'category': CATEGORIES[i % len(CATEGORIES)],
+                'season': SEASONS[i % len(SEASONS)], 'size_data': {'length': str(60 + i)}}
+        store.add_item(closet, item)
+        store.put_features(sha, features.pack(features.compute(img)))
+        store.put_tags(sha, TAGS)
+        items.append(item)
+    return items
+
+
+def export(store, closet):
+    buffered = io.BytesIO()
+    archive.export_items(store, store.list_items(closet), buffered)
+    return buffered.getvalue()
+
+
+def build_zip(header, lines, files):
+    # lines: manifest 內容 (已經係字串，方便放壞行)；files: {arcname: bytes}
+    buffered = io.BytesIO()
+    with zipfile.ZipFile(buffered, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+        zf.writestr(archive.MANIFEST, "\n".join([json.dumps(header)] + lines) + "\n")
+    return io.BytesIO(buffered.getvalue())
+
+
+def entry_for(data, **fields):
+    sha = hashlib.sha256(data).hexdigest()
+    entry = {"id": str(uuid.uuid4()), "sha": sha, "category": "上衣", "season": "四季", "size_data": {},
+             "features": None, "tags": None}
+    entry.update(fields)
+    return entry, {f"images/{sha}.jpg": data}
+
+
+def header(n):
+    return {"format": archive.FORMAT, "version": archive.VERSION, "items": n}
+
+
+def test_round_trip(store):
+    items = seed(store, "a", 4)
+    added, duplicates, failures = archive.import_items(store, "b", io.BytesIO(export(store, "a")),
+                                                       CATEGORIES, SEASONS)
+    assert (len(added), duplicates, failures) == (4, [], [])
+    restored = {x['sha']: x for x in store.list_items("b")}
+    for item in items:
+        assert restored[item['sha']]['category'] == item['category']
+        assert restored[item['sha']]['size_data'] == item['size_data']
+    assert store.get_tags(restored) == {sha: TAGS for sha in restored}
+    # 同一個衣櫃再匯入：全部當重複
+    added, duplicates, _ = archive.import_items(store, "b", io.BytesIO(export(store, "a")), CATEGORIES, SEASONS,
+                                                known_shas=set(restored))
+    assert (len(added), len(duplicates)) == (0, 4)
+
+
+def test_rejects_bad_entries(store):
+    lines, files = [], {}
+    bad = [
+        dict(features=base64.b64encode(b"\0" * 3).decode()),
+        dict(tags="red"),
+        dict(size_data="oops"),
+        dict(category="帽子???"),
+    ]
+    for n, fields in enumerate(bad):
+        entry, f = entry_for(jpeg(n), **fields)
+        lines.append(json.dumps(entry, ensure_ascii=False))
+        files.update(f)
+    # 唔係圖片 / 縮圖壞咗
+    entry, f = entry_for(b"not an image")
+    lines.append(json.dumps(entry))
+    files.update(f)
+    entry, f = entry_for(jpeg(9))
+    files.update(f)
+    files[f"thumbs/{entry['sha']}_{DISPLAY_SIZE}.jpg"] = b"\xff\xd8broken"
+    lines.append(json.dumps(entry))
+    # 唔係 object 嘅行 / 壞 JSON
+    lines += ["[1, 2]", "{not json"]
+    added, _, failures = archive.import_items(store, "c", build_zip(header(len(lines)), lines, files),
+                                              CATEGORIES, SEASONS)
+    assert added == []
+    assert len(failures) == len(lines)
+    assert store.list_items("c") == []
+
+
+def test_partial_results_survive_bad_lines(store, monkeypatch):
+    monkeypatch.setattr(archive, "DB_BATCH", 2)
+    lines, files = [], {}
+    for n in range(3):
+        entry, f = entry_for(jpeg(n))
+        lines.append(json.dumps(entry))
+        files.update(f)
+    lines.append("{not json")
+    added, _, failures = archive.import_items(store, "d", build_zip(header(4), lines, files),
+                                              CATEGORIES, SEASONS)
+    assert len(added) == 3 and len(failures) == 1
+    assert len(store.list_items("d")) == 3
+
+
+@pytest.mark.parametrize("bad_header", [[1, 2], {"format": archive.FORMAT, "version": "1"}, {"format": "zip"}])
+def test_bad_header_is_value_error(store, bad_header):
+    with pytest.raises(ValueError):
+        archive.import_items(store, "e", build_zip(bad_header, [], {}), CATEGORIES, SEASONS)
@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_jobs import ChatRunner  # noqa: E402
+
+
+def blocking_work(job):
+    yield "開始"
+    while not job.cancel.is_set():
+        time.sleep(0.01)
+
+
+def test_finished_job_is_not_cancelled():
+    runner = ChatRunner(max_active=1)
+    job = runner.submit("s", "q", lambda job: iter(["答案"]))
+    job.future.result()
+    # 答完先嚟 cancel：唔當取消，結果仲攞得返
+    assert runner.cancel("s") is False
+    assert runner.get("s") is job and job.state == "done" and job.text() == "答案"
+
+
+def test_concurrency_limit_and_queued_cancel():
+    runner = ChatRunner(max_active=1)
+    first = runner.submit("a", "q", blocking_work)
+    second = runner.submit("b", "q", blocking_work)
+    time.sleep(0.1)
+    assert (first.state, second.state) == ("running", "queued")
+    assert runner.cancel("b") is True and second.finished()
+    assert runner.cancel("a") is True
+    first.future.result(timeout=1)
+    assert runner.stats()["running"] == 0
+
+
+def test_resubmit_cancels_previous_job():
+    runner = ChatRunner(max_active=2)
+    old = runner.submit("s", "q1", blocking_work)
+    new = runner.submit("s", "q2", lambda job: iter(["ok"]))
+    new.future.result()
+    assert old.cancel.is_set() and runner.get("s") is new
+    # pop 只會移走同一個 job
+    runner.pop("s", old)
+    assert runner.get("s") is new
+
+
+def test_fallback_when_work_yields_nothing():
+    runner = ChatRunner(max_active=1)
+    done = threading.Event()
+
+    def work(job):
+        done.set()
+        return iter(())
+    job = runner.submit("s", "q", work)
+    job.future.result()
+    assert done.is_set() and job.fallback and job.state == "done"
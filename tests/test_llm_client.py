@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_client import HEALTH_HALF_LIFE, IncompleteStream, ModelStats, OpenRouterClient  # noqa: E402
+
+# 本地 stub server：按 request 入面嘅 model 名決定點答
+# BEHAVIOUR[model] = (延遲秒數, HTTP status, 回覆文字)
+# STREAM[model] = (SSE 文字片段, 有冇 [DONE])；片段送完冇 [DONE] 就直接閂線 (模擬中途斷)
+BEHAVIOUR = {}
+STREAM = {}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("stream"):
+            self.stream(*STREAM[body["model"]])
+            return
+        delay, status, text = BEHAVIOUR.get(body["model"], (0, 500, None))
+        time.sleep(delay)
+        out = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        except OSError:
+            pass
+
+    def stream(self, deltas, done):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for text in deltas:
+            self.wfile.write(b"data: " + json.dumps({"choices": [{"delta": {"content": text}}]}).encode() + b"\n\n")
+            self.wfile.flush()
+        if done: self.wfile.write(b"data: [DONE]\n\n")
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}/"
+    srv.shutdown()
+
+
+def make_client(url, **kwargs):
+    return OpenRouterClient("test", url=url, models=["slow", "fast"], timeout=5, **kwargs)
+
+
+def test_hedged_first_answer_wins(stub_url):
+    BEHAVIOUR.update({"slow": (2.0, 200, "slow"), "fast": (0, 200, "fast")})
+    client = make_client(stub_url, hedge_delay=0.1)
+    t0 = time.perf_counter()
+    assert client.chat([{"type": "text", "text": "hi"}]) == "fast"
+    assert time.perf_counter() - t0 < 1.5
+
+
+def test_falls_back_after_failure(stub_url):
+    BEHAVIOUR.update({"slow": (0, 500, None), "fast": (0, 200, "fast")})
+    client = make_client(stub_url, hedged=False)
+    assert client.chat([{"type": "text", "text": "hi"}]) == "fast"
+    assert client.stats_snapshot()["slow"]["errors"] == 1
+    # 失敗咗嘅 model 排後
+    assert client.ordered_models() == ["fast", "slow"]
+
+
+def test_cancel_returns_early(stub_url):
+    BEHAVIOUR.update({"slow": (3.0, 200, "slow"), "fast": (3.0, 200, "fast")})
+    client = make_client(stub_url, hedge_delay=0.1)
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    t0 = time.perf_counter()
+    assert client.chat([{"type": "text", "text": "hi"}], cancel=cancel) is None
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_error_rate_decays():
+    stats = ModelStats()
+    for _ in range(5):
+        stats.record(False, 1.0, now=0.0)
+    before = stats.error_rate(now=0.0)
+    assert before > 0.8
+    assert stats.error_rate(now=HEALTH_HALF_LIFE * 4) < 0.1
+    # 最近成功會拉低錯誤率
+    stats.record(True, 0.5, now=1.0)
+    assert stats.error_rate(now=1.0) < before
+
+
+def test_stream_complete(stub_url):
+    STREAM.update({"slow": (["你好", "[ID: 1]"], True)})
+    client = make_client(stub_url)
+    assert list(client.stream_chat([{"type": "text", "text": "hi"}])) == ["你好", "[ID: 1]"]
+
+
+def test_stream_cut_after_first_token_raises(stub_url):
+    STREAM.update({"slow": (["你好", "[ID: 1]"], False), "fast": (["唔應該用到"], True)})
+    client = make_client(stub_url)
+    got = []
+    with pytest.raises(IncompleteStream):
+        for delta in client.stream_chat([{"type": "text", "text": "hi"}]):
+            got.append(delta)
+    # 已經開始咗就唔會再試下一個 model
+    assert got == ["你好", "[ID: 1]"]
+
+
+def test_stream_cut_before_first_token_tries_next_model(stub_url):
+    STREAM.update({"slow": ([], False), "fast": (["好"], True)})
+    client = make_client(stub_url)
+    assert list(client.stream_chat([{"type": "text", "text": "hi"}])) == ["好"]
+    assert client.stats_snapshot()["slow"]["errors"] == 1
+
+
+def test_stream_ttft_does_not_touch_latency(stub_url):
+    STREAM.update({"slow": (["好"], True)})
+    client = make_client(stub_url)
+    list(client.stream_chat([{"type": "text", "text": "hi"}]))
+    stats = client.stats_snapshot()["slow"]
+    # 串流只記 TTFT；完整回覆延遲照舊由 chat() 負責，排序唔會因為串流變快
+    assert stats["ttft"] is not None and stats["latency"] is None
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import query_wants_images  # noqa: E402
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("呢套好唔好睇？", True),
+    ("how do I look?", True),
+    ("send me some photos", True),
+    ("I'm looking for a jacket", False),
+    ("any lookbook ideas", False),
+    ("今日著咩好", False),
+])
+def test_query_wants_images(query, expected):
+    assert query_wants_images(query) is expected
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tagging  # noqa: E402
+from llm_client import OpenRouterClient  # noqa: E402
+from wardrobe_store import WardrobeStore  # noqa: E402
+
+TAG = {"colour": "黑色", "material": "棉", "formality": "休閒", "pattern": "純色", "warmth": 2}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # 每張圖回一個固定標籤；fail = True 就回 500
+    batches = []
+    fail = False
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        parts = body["messages"][0]["content"]
+        n = sum(1 for p in parts if p["type"] == "image_url")
+        StubHandler.batches.append(n)
+        if StubHandler.fail:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        text = "以下係結果：\n" + json.dumps([TAG] * n, ensure_ascii=False)
+        out = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}/"
+    srv.shutdown()
+
+
+@pytest.fixture
+def tagger(stub_url, tmp_path):
+    StubHandler.batches.clear()
+    StubHandler.fail = False
+    executor = ThreadPoolExecutor(max_workers=1)
+    client = OpenRouterClient("test", url=stub_url, models=["m"], hedged=False, timeout=5)
+    yield tagging.Tagger(WardrobeStore(str(tmp_path / "closet_data")), client, executor, batch_size=3)
+    executor.shutdown(wait=True)
+
+
+def drain(tagger):
+    # executor 得一個 worker：排喺最後嘅空 job 完成 = 之前嘅 batch 都完成
+    tagger.executor.submit(lambda: None).result()
+
+
+def load_b64(sha):
+    return "aGVsbG8="
+
+
+def test_parse_tags():
+    assert tagging.parse_tags("前言 " + json.dumps([TAG, TAG]) + " 後記", 2) == [TAG, TAG]
+    assert tagging.parse_tags(json.dumps([TAG]), 2) is None
+    assert tagging.parse_tags("唔係 JSON", 1) is None
+    assert tagging.parse_tags(json.dumps([TAG, "red"]), 2) == [TAG, None]
+
+
+def test_clean_tags():
+    raw = {"colour": "深深深深深深藍藍藍色", "material": " ", "formality": "超正式", "pattern": "條紋", "warmth": "9"}
+    assert tagging.clean_tags(raw) == {"colour": "深深深深深深藍藍", "pattern": "條紋"}
+    assert tagging.clean_tags({"warmth": "3"}) == {"warmth": 3}
+    assert tagging.clean_tags("red") is None
+    assert tagging.clean_tags({}) is None
+
+
+def test_batches_and_version(tagger):
+    shas = [f"sha{i}" for i in range(7)]
+    assert tagger.schedule(shas + shas[:2], load_b64) == 7
+    drain(tagger)
+    assert sorted(StubHandler.batches) == [1, 3, 3]
+    assert tagger.store.get_tags(shas) == {sha: TAG for sha in shas}
+    assert tagger.version == 3 and tagger.pending() == 0
+    # 已經有標籤嘅唔會再送
+    assert tagger.schedule(shas, load_b64) == 0
+
+
+def test_failed_batches_back_off(tagger, monkeypatch):
+    StubHandler.fail = True
+    assert tagger.schedule(["a", "b"], load_b64) == 2
+    drain(tagger)
+    assert tagger.version == 0 and tagger.store.get_tags(["a", "b"]) == {}
+    # RETRY_AFTER 之內唔會再試
+    assert tagger.schedule(["a", "b"], load_b64) == 0
+    StubHandler.fail = False
+    monkeypatch.setattr(tagging, "RETRY_AFTER", 0)
+    assert tagger.schedule(["a", "b"], load_b64) == 2
+    drain(tagger)
+    assert tagger.version == 1 and set(tagger.store.get_tags(["a", "b"])) == {"a", "b"}
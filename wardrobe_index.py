@@ -0,0 +1,105 @@
+# --- 衣櫃索引：穩定短 ID + 分類/季節分桶，增量更新 ---
+# item['sid'] 係每個衣櫃內遞增、永不重用嘅短 ID，對話 [ID: n] / 試身室都用佢，
+# 刪除其他單品都唔會令 ID 移位。
+
+# 季節篩選 -> 包含嘅季節標籤
+SEASON_FILTERS = {
+    "全部": None,
+    "春夏": ["四季", "春夏"],
+    "秋冬": ["四季", "秋冬"],
+}
+
+
+class WardrobeIndex:
+    def __init__(self, items=()):
+        self._items = {}      # id -> item (保持加入次序)
+        self._by_sid = {}     # sid -> item
+        self._keys = {}       # id -> (category, season)，用嚟搬桶
+        self._buckets = {}    # (category, season) -> {id: item}
+        self.version = 0      # 每次改動 +1，畀其他快取判斷要唔要重建
+        self._filter_memo = {}
+        for item in items:
+            self.add(item)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, sid):
+        return sid in self._by_sid
+
+    def get(self, sid):
+        return self._by_sid.get(sid) if sid is not None else None
+
+    def by_id(self, item_id):
+        return self._items.get(item_id)
+
+    def _touch(self):
+        self.version += 1
+        self._filter_memo.clear()
+
+    def memo(self, key, build, stamp=None):
+        # 衣櫃冇變就重用上次結果 (例如 prompt 用嘅衣櫃摘要)；任何改動都會清走
+        # stamp: 衣櫃以外嘅依賴 (例如 AI 標籤版本)，變咗都要重建
+        cached = self._filter_memo.get(("memo", key))
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, build())
+            self._filter_memo[("memo", key)] = cached
+        return cached[1]
+
+    def _bucket(self, item):
+        key = (item.get('category'), item.get('season', '四季'))
+        self._keys[item['id']] = key
+        self._buckets.setdefault(key, {})[item['id']] = item
+
+    def _unbucket(self, item):
+        key = self._keys.pop(item['id'], None)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(item['id'], None)
+            if not bucket: del self._buckets[key]
+
+    def add(self, item):
+        self._items[item['id']] = item
+        self._by_sid[item['sid']] = item
+        self._bucket(item)
+        self._touch()
+
+    def remove(self, item):
+        self._items.pop(item['id'], None)
+        self._by_sid.pop(item['sid'], None)
+        self._unbucket(item)
+        self._touch()
+
+    def update(self, item):
+        # 分類 / 季節改咗就由舊桶搬去新桶；尺碼改動都會 bump version
+        if self._keys.get(item['id']) != (item.get('category'), item.get('season', '四季')):
+            self._unbucket(item)
+            self._bucket(item)
+        self._touch()
+
+    def _matching_buckets(self, season_filter, categories=None):
+        seasons = SEASON_FILTERS.get(season_filter)
+        for (cat, sea), bucket in self._buckets.items():
+            if seasons is not None and sea not in seasons: continue
+            if categories and cat not in categories: continue
+            yield cat, bucket
+
+    def categories(self, season_filter="全部"):
+        # 只睇有貨嘅桶，唔使掃晒全部單品
+        return sorted({cat for cat, _ in self._matching_buckets(season_filter)}, key=str)
+
+    def filter(self, season_filter="全部", categories=None):
+        memo_key = (season_filter, tuple(sorted(categories)) if categories else None)
+        if memo_key not in self._filter_memo:
+            items = []
+            for _, bucket in self._matching_buckets(season_filter, categories):
+                items.extend(bucket.values())
+            items.sort(key=lambda x: x['sid'])
+            self._filter_memo[memo_key] = items
+        return self._filter_memo[memo_key]
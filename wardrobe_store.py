@@ -0,0 +1,269 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+# --- 衣櫃持久化：SQLite 存 metadata，圖片以內容 hash 存成 blob ---
+# closet_data/
+#   wardrobe.db          items 表 (category / season / size_data ...) + features / tags 表 (按 sha)
+#   blobs/ab/abcd...     原圖 (sha256 命名，相同圖片只存一份)
+#   derived/abcd..._400.jpg  縮圖 (按需要產生，之後直接讀檔)
+
+DATA_DIR = "closet_data"
+DISPLAY_SIZE = 400   # 衣櫃格仔 / 試身室用
+LLM_SIZE = 512       # 送畀 model 用
+DERIVED_SIZES = (DISPLAY_SIZE, LLM_SIZE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    closet TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    category TEXT NOT NULL,
+    season TEXT NOT NULL,
+    size_data TEXT NOT NULL DEFAULT '{}',
+    created REAL NOT NULL,
+    sid INTEGER
+);
+CREATE INDEX IF NOT EXISTS items_closet ON items (closet, created);
+CREATE INDEX IF NOT EXISTS items_sha ON items (sha);
+CREATE TABLE IF NOT EXISTS features (
+    sha TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    sha TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS closets (
+    closet TEXT PRIMARY KEY,
+    next_sid INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class WardrobeStore:
+    def __init__(self, root=DATA_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.derived_dir = os.path.join(root, "derived")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.derived_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Streamlit 每個 session 都喺唔同 thread 跑，所以共用一條連線 + lock
+        self._db = sqlite3.connect(os.path.join(root, "wardrobe.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # 舊版 DB 冇 sid：按加入次序補番，並記低每個衣櫃下一個 sid
+        cols = [r[1] for r in self._db.execute("PRAGMA table_info(items)")]
+        with self._db:
+            if 'sid' not in cols:
+                self._db.execute("ALTER TABLE items ADD COLUMN sid INTEGER")
+            closets = [r[0] for r in self._db.execute("SELECT DISTINCT closet FROM items WHERE sid IS NULL")]
+            for closet in closets:
+                next_sid = self._next_sid(closet)
+                ids = [r[0] for r in self._db.execute(
+                    "SELECT id FROM items WHERE closet = ? AND sid IS NULL ORDER BY created", (closet,))]
+                for item_id in ids:
+                    self._db.execute("UPDATE items SET sid = ? WHERE id = ?", (next_sid, item_id))
+                    next_sid += 1
+                self._set_next_sid(closet, next_sid)
+            self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS items_sid ON items (closet, sid)")
+
+    def _next_sid(self, closet):
+        row = self._db.execute("SELECT next_sid FROM closets WHERE closet = ?", (closet,)).fetchone()
+        if row: return row[0]
+        row = self._db.execute("SELECT MAX(sid) FROM items WHERE closet = ?", (closet,)).fetchone()
+        return (row[0] + 1) if row and row[0] is not None else 0
+
+    def _set_next_sid(self, closet, next_sid):
+        self._db.execute(
+            "INSERT INTO closets (closet, next_sid) VALUES (?, ?) "
+            "ON CONFLICT(closet) DO UPDATE SET next_sid = excluded.next_sid", (closet, next_sid))
+
+    # --- Blobs ---
+    def blob_path(self, sha):
+        return os.path.join(self.blob_dir, sha[:2], sha)
+
+    def put_blob(self, data):
+        sha = sha256_bytes(data)
+        path = self.blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return sha
+
+    def load_image(self, sha):
+        # 真正需要像素先 decode
+        img = Image.open(self.blob_path(sha))
+        return ImageOps.exif_transpose(img)
+
+    def derived_path(self, sha, size):
+        path = os.path.join(self.derived_dir, f"{sha}_{size}.jpg")
+        if not os.path.exists(path):
+            img = self.load_image(sha).convert('RGB')
+            img.thumbnail((size, size))
+            buffered = io.BytesIO()
+            img.save(buffered, format="JPEG")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(buffered.getvalue())
+            os.replace(tmp, path)
+        return path
+
+    def put_derived(self, sha, size, data):
+        # 上傳流水線已經縮好圖，直接寫入，慳返一次 decode
+        path = os.path.join(self.derived_dir, f"{sha}_{size}.jpg")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def derived_bytes(self, sha, size):
+        with open(self.derived_path(sha, size), "rb") as f:
+            return f.read()
+
+    def discard_blob(self, sha):
+        # 寫咗 blob 但最後冇用 (例如重複上傳) 就清走
+        with self._lock:
+            self._drop_blob_if_unused(sha)
+
+    def _drop_blob_if_unused(self, sha):
+        row = self._db.execute("SELECT 1 FROM items WHERE sha = ? LIMIT 1", (sha,)).fetchone()
+        if row: return
+        with self._db:
+            self._db.execute("DELETE FROM features WHERE sha = ?", (sha,))
+            self._db.execute("DELETE FROM tags WHERE sha = ?", (sha,))
+        self._remove_files([sha])
+
+    def _remove_files(self, shas):
+        # 縮圖檔名固定 ({sha}_{size}.jpg)，直接刪，唔使 listdir
+        for sha in shas:
+            paths = [self.blob_path(sha)] + [os.path.join(self.derived_dir, f"{sha}_{size}.jpg") for size in DERIVED_SIZES]
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # --- 視覺特徵 (features.pack 出嚟嘅 bytes) ---
+    def get_features(self, shas):
+        shas = list(shas)
+        out = {}
+        with self._lock:
+            for i in range(0, len(shas), 500):
+                chunk = shas[i:i + 500]
+                q = f"SELECT sha, data FROM features WHERE sha IN ({','.join('?' * len(chunk))})"
+                out.update({r[0]: r[1] for r in self._db.execute(q, chunk)})
+        return out
+
+    def put_features(self, sha, data):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO features (sha, data) VALUES (?, ?)", (sha, data))
+
+    # --- AI 標籤 (tagging.py 格式嘅 dict，存做 JSON) ---
+    def get_tags(self, shas):
+        shas = list(shas)
+        out = {}
+        with self._lock:
+            for i in range(0, len(shas), 500):
+                chunk = shas[i:i + 500]
+                q = f"SELECT sha, data FROM tags WHERE sha IN ({','.join('?' * len(chunk))})"
+                out.update({r[0]: json.loads(r[1]) for r in self._db.execute(q, chunk)})
+        return out
+
+    def put_tags(self, sha, tags):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO tags (sha, data) VALUES (?, ?)",
+                             (sha, json.dumps(tags, ensure_ascii=False)))
+
+    # --- Items ---
+    def list_items(self, closet):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, sid, sha, category, season, size_data FROM items WHERE closet = ? ORDER BY sid",
+                (closet,)).fetchall()
+        return [{'id': r[0], 'sid': r[1], 'sha': r[2], 'category': r[3], 'season': r[4], 'size_data': json.loads(r[5])}
+                for r in rows]
+
+    def add_item(self, closet, item):
+        # 分配穩定短 ID (item['sid'])；刪除後都唔會重用
+        with self._lock, self._db:
+            sid = self._next_sid(closet)
+            self._db.execute(
+                "INSERT INTO items (id, closet, sid, sha, category, season, size_data, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (item['id'], closet, sid, item['sha'], item['category'], item['season'],
+                 json.dumps(item.get('size_data', {}), ensure_ascii=False), time.time()))
+            self._set_next_sid(closet, sid + 1)
+        item['sid'] = sid
+        return sid
+
+    def add_items(self, closet, items, features=None, tags=None):
+        # 批量版 add_item (匯入用)：一個 transaction 寫晒 items + 特徵 + 標籤
+        with self._lock, self._db:
+            sid = self._next_sid(closet)
+            now = time.time()
+            for item in items:
+                self._db.execute(
+                    "INSERT INTO items (id, closet, sid, sha, category, season, size_data, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (item['id'], closet, sid, item['sha'], item['category'], item['season'],
+                     json.dumps(item.get('size_data', {}), ensure_ascii=False), now))
+                item['sid'] = sid
+                sid += 1
+            self._set_next_sid(closet, sid)
+            # 特徵 / 標籤按 sha 全部衣櫃共用：已經有就唔好用匯入嘅蓋過
+            self._db.executemany("INSERT OR IGNORE INTO features (sha, data) VALUES (?, ?)",
+                                 list((features or {}).items()))
+            self._db.executemany("INSERT OR IGNORE INTO tags (sha, data) VALUES (?, ?)",
+                                 [(sha, json.dumps(t, ensure_ascii=False)) for sha, t in (tags or {}).items()])
+        return items
+
+    def has_items(self, item_ids):
+        item_ids = list(item_ids)
+        found = set()
+        with self._lock:
+            for i in range(0, len(item_ids), 500):
+                chunk = item_ids[i:i + 500]
+                q = f"SELECT id FROM items WHERE id IN ({','.join('?' * len(chunk))})"
+                found.update(r[0] for r in self._db.execute(q, chunk))
+        return found
+
+    def update_item(self, item):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE items SET category = ?, season = ?, size_data = ? WHERE id = ?",
+                (item['category'], item['season'], json.dumps(item.get('size_data', {}), ensure_ascii=False), item['id']))
+
+    def delete_item(self, item):
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM items WHERE id = ?", (item['id'],))
+            self._drop_blob_if_unused(item['sha'])
+
+    def clear(self, closet):
+        # 一個 transaction 刪晒，再刪其他衣櫃冇用緊嘅圖檔
+        with self._lock:
+            shas = [r[0] for r in self._db.execute("SELECT DISTINCT sha FROM items WHERE closet = ?", (closet,))]
+            with self._db:
+                self._db.execute("DELETE FROM items WHERE closet = ?", (closet,))
+                unused = [sha for sha in shas
+                          if not self._db.execute("SELECT 1 FROM items WHERE sha = ? LIMIT 1", (sha,)).fetchone()]
+                self._db.executemany("DELETE FROM features WHERE sha = ?", [(sha,) for sha in unused])
+                self._db.executemany("DELETE FROM tags WHERE sha = ?", [(sha,) for sha in unused])
+            self._remove_files(unused)
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import requests
+
+# --- 天氣快取：全 process 按城市共用，TTL + stale-while-revalidate ---
+# get() 永遠唔會等網絡：冇數據 / 過期就喺背景 thread 更新，先回傳手頭上嘅 (可能過期) 數據
+
+WEATHER_URL = "https://api.open-meteo.com/v1/forecast"
+WEATHER_TTL = 15 * 60      # 秒
+ERROR_BACKOFF = 60         # 失敗後隔幾耐先再試
+
+CITY_COORDS = {
+    "香港": {"lat": 22.3193, "lon": 114.1694},
+    "台北": {"lat": 25.0330, "lon": 121.5654},
+    "東京": {"lat": 35.6762, "lon": 139.6503},
+    "首爾": {"lat": 37.5665, "lon": 126.9780},
+    "倫敦": {"lat": 51.5074, "lon": -0.1278}
+}
+
+
+def condition_message(wcode):
+    if wcode is None: return "天氣不錯"
+    if wcode <= 3: return "天晴，心情都要靚靚！"
+    if wcode in [45, 48]: return "有霧，出門小心。"
+    if wcode in [51, 53, 55, 61, 63, 65, 80, 81, 82]: return "出面落緊雨，記得帶遮呀！"
+    if wcode >= 95: return "有雷暴，留在室內安全啲！"
+    return "天氣不錯"
+
+
+class WeatherCache:
+    def __init__(self, url=WEATHER_URL, ttl=WEATHER_TTL, timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._data = {}       # city -> {"temp", "code", "fetched"}
+        self._failed = {}     # city -> 上次失敗時間
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def get(self, city, now=None):
+        # 回傳 {"temp", "code", "fetched", "stale"} 或 None (未有數據 / 城市唔支援)
+        if city not in CITY_COORDS: return None
+        now = now or time.time()
+        with self._lock:
+            entry = self._data.get(city)
+            stale = entry is None or now - entry["fetched"] > self.ttl
+            backing_off = now - self._failed.get(city, 0) < ERROR_BACKOFF
+            if stale and not backing_off and city not in self._inflight:
+                self._inflight.add(city)
+                threading.Thread(target=self._refresh, args=(city,), daemon=True,
+                                 name=f"weather-{city}").start()
+        if entry is None: return None
+        return dict(entry, stale=stale)
+
+    def failed(self, city):
+        with self._lock:
+            return city in self._failed
+
+    def refresh_now(self, city):
+        # 同步更新 (測試 / 預熱用)
+        with self._lock:
+            self._inflight.add(city)
+        self._refresh(city)
+        return self._data.get(city)
+
+    def _refresh(self, city):
+        try:
+            c = CITY_COORDS[city]
+            params = {"latitude": c["lat"], "longitude": c["lon"],
+                      "current": "temperature_2m,weather_code", "timezone": "auto"}
+            data = self.session.get(self.url, params=params, timeout=self.timeout).json()
+            entry = {"temp": data['current']['temperature_2m'],
+                     "code": data['current']['weather_code'],
+                     "fetched": time.time()}
+            with self._lock:
+                self._data[city] = entry
+                self._failed.pop(city, None)
+        except Exception:
+            with self._lock:
+                self._failed[city] = time.time()
+        finally:
+            with self._lock:
+                self._inflight.discard(city)
+
+
+def greeting(city, user_name, entry, failed=False):
+    if city not in CITY_COORDS: return f"Hi {user_name}, {city} 天氣不錯！"
+    if entry is None:
+        return f"Hi {user_name}, {city} 暫時無法連線。" if failed else f"Hi {user_name}, {city} 天氣查詢中..."
+    return f"Hi {user_name}, {city}依家 {entry['temp']}°C, {condition_message(entry['code'])}"